@@ -4,8 +4,10 @@ import logging
 from celery import shared_task
 from django.db import NotSupportedError
 from django.db.models import Count
+from django.utils import timezone
 
 from dashboard.models import Audio, Image, Participant, Transcription
+from local_voice.utils import validation_queue
 from local_voice.utils.constants import (ParticipantType, TranscriptionStatus,
                                          ValidationStatus)
 from setup.models import AppConfiguration
@@ -18,7 +20,7 @@ logger = logging.getLogger("app")
 
 @shared_task()
 def delete_audios_with_zero_duration():
-    configuration = AppConfiguration.objects.first()
+    configuration = AppConfiguration.get_cached()
     audios = Audio.objects.filter(duration=0)
     deleted = audios.delete()
 
@@ -169,11 +171,16 @@ def update_statistics():
     stats.save()
 
 
+# Work endpoints now lease audios instead of flagging them in_review, and
+# expired leases are claimable again without a sweep. These tasks only release
+# audios flagged before leases were introduced.
 @shared_task()
 def release_audios_in_review_for_more_than_ten_minutes():
     updated_time = datetime.datetime.now() - datetime.timedelta(minutes=5)
     orphan_objects = Audio.objects.filter(updated_at__lte=updated_time, second_audio_status=ValidationStatus.IN_REVIEW.value)
-    res = orphan_objects.update(second_audio_status=ValidationStatus.PENDING.value)
+    audio_ids = list(orphan_objects.values_list("id", flat=True))
+    res = Audio.objects.filter(id__in=audio_ids).update(second_audio_status=ValidationStatus.PENDING.value)
+    validation_queue.refresh(audio_ids)
     return f"Made {res} audios available"
 
 @shared_task()
@@ -184,26 +191,57 @@ def release_audios_in_transcription_review():
     res = audios.update(transcription_status=TranscriptionStatus.PENDING.value)
     return f"Made {res} audios available"
 
+# Audios checked per query by the full rescan.
+AGREEMENT_CHUNK_SIZE = 5000
+
+
+def decide_transcription_agreement(audios, required_transcription_validation_count):
+    """
+    Accept the pending audios whose transcriptions all have the same text and
+    flag the others as conflicts, once they have enough transcriptions.
+    Returns the number of accepted and conflicting audios.
+    """
+    decisions = audios.filter(transcription_status=TranscriptionStatus.PENDING.value)\
+        .values("id")\
+        .annotate(t_count=Count("transcriptions"),
+                  text_count=Count("transcriptions__text_fingerprint", distinct=True))\
+        .filter(t_count__gte=required_transcription_validation_count)\
+        .values_list("id", "text_count")
+
+    accepted_ids, conflict_ids = [], []
+    for audio_id, text_count in decisions:
+        (accepted_ids if text_count == 1 else conflict_ids).append(audio_id)
+
+    now = timezone.now()
+    pending = Audio.objects.filter(transcription_status=TranscriptionStatus.PENDING.value)
+    if accepted_ids:
+        pending.filter(id__in=accepted_ids).update(transcription_status=TranscriptionStatus.ACCEPTED.value, updated_at=now)
+        Transcription.objects.filter(audio_id__in=accepted_ids).update(transcription_status=TranscriptionStatus.ACCEPTED.value)
+    if conflict_ids:
+        pending.filter(id__in=conflict_ids).update(transcription_status=TranscriptionStatus.CONFLICT.value, updated_at=now)
+    return len(accepted_ids), len(conflict_ids)
+
+
 @shared_task()
-def validate_audio_transcriptions():
-    configuration = AppConfiguration.objects.first()
+def validate_audio_transcriptions(audio_ids=None):
+    """
+    Check the transcriptions of the given audios for agreement, as queued when
+    transcriptions are submitted. Without `audio_ids`, all pending audios are
+    rescanned in chunks as a fallback.
+    """
+    configuration = AppConfiguration.get_cached()
     required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 1
 
-    audios = Audio.objects.annotate(t_count=Count("transcriptions")).filter(
-            transcription_status=TranscriptionStatus.PENDING.value)\
-            .filter(t_count__gte=required_transcription_validation_count)
-
-    for audio in audios:
-        transcritions = set()
-        for transcription in audio.transcriptions.all():
-            text = transcription.text.lower()
-            text = " ".join(text.split())
-            if transcritions and not text in transcritions:
-                audio.transcription_status = TranscriptionStatus.CONFLICT.value
-                audio.save()
-                break
-            transcritions.add(text)
-        else:
-            audio.transcription_status = TranscriptionStatus.ACCEPTED.value
-            audio.save()
-            audio.transcriptions.all().update(transcription_status = TranscriptionStatus.ACCEPTED.value)
\ No newline at end of file
+    if audio_ids is not None:
+        accepted, conflicts = decide_transcription_agreement(
+            Audio.objects.filter(id__in=audio_ids), required_transcription_validation_count)
+    else:
+        accepted = conflicts = 0
+        last_id = Audio.objects.order_by("-id").values_list("id", flat=True).first() or 0
+        for chunk_start in range(0, last_id + 1, AGREEMENT_CHUNK_SIZE):
+            chunk = Audio.objects.filter(id__gte=chunk_start, id__lt=chunk_start + AGREEMENT_CHUNK_SIZE)
+            chunk_accepted, chunk_conflicts = decide_transcription_agreement(
+                chunk, required_transcription_validation_count)
+            accepted += chunk_accepted
+            conflicts += chunk_conflicts
+    return f"Accepted {accepted} audios and flagged {conflicts} conflicts"
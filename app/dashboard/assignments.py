@@ -0,0 +1,66 @@
+"""Expiry of the audios assigned to users in bulk.
+
+Every assigned audio carries the time it was assigned. Audios the assigned
+user did not work on within the configured hours are taken back in bounded
+batches, leaving the rest of the assignment in place.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef
+from django.utils import timezone
+
+from dashboard.models import (Audio, AudioTranscriptionAssignment,
+                              AudioValidationAssignment, Transcription,
+                              TranscriptionResolutionAssignment, Validation)
+from dashboard.signals import ASSIGNMENT_COUNTERS
+
+EXPIRY_BATCH_SIZE = 1000
+# Bounds a single run; the remainder expires on the next one.
+MAX_EXPIRY_BATCHES = 100
+
+
+def get_work_done(assignment_model, user_ref):
+    """Return the work of the user `user_ref` on the audio of a through row."""
+    if assignment_model is AudioValidationAssignment:
+        return Validation.objects.filter(audio_validations=OuterRef("audio_id"), user=user_ref)
+    if assignment_model is AudioTranscriptionAssignment:
+        return Transcription.objects.filter(audio=OuterRef("audio_id"), user=user_ref)
+    if assignment_model is TranscriptionResolutionAssignment:
+        return Transcription.objects.filter(audio=OuterRef("audio_id"), conflict_resolved_by=user_ref)
+    raise ValueError(f"Unknown assignment model: {assignment_model}")
+
+
+def expire_assigned_audios(assignment_model, hours):
+    """
+    Remove audios assigned more than `hours` ago, and not worked on by the
+    assigned user since, from the assignments of `assignment_model`. Returns
+    the ids of the released audios.
+    """
+    through = assignment_model.audios.through
+    counter = ASSIGNMENT_COUNTERS[assignment_model]
+    expiry_date = timezone.now() - timedelta(hours=hours)
+    assignment_field = next(field.name for field in through._meta.fields
+                            if field.related_model is assignment_model)
+    work_done = get_work_done(assignment_model, OuterRef(f"{assignment_field}__user_id"))
+
+    released_audio_ids = []
+    for _ in range(MAX_EXPIRY_BATCHES):
+        with transaction.atomic():
+            rows = list(
+                through.objects.filter(assigned_at__lte=expiry_date).filter(~Exists(work_done)).order_by(
+                    "id").select_for_update(skip_locked=True).values_list(
+                        "id", "audio_id")[:EXPIRY_BATCH_SIZE])
+            if not rows:
+                break
+            through.objects.filter(id__in=[row_id for row_id, _ in rows]).delete()
+
+            # Deleting through rows directly does not send m2m_changed.
+            audio_ids_by_count = {}
+            for audio_id, count in Counter(audio_id for _, audio_id in rows).items():
+                audio_ids_by_count.setdefault(count, []).append(audio_id)
+            for count, audio_ids in audio_ids_by_count.items():
+                Audio.objects.filter(id__in=audio_ids).update(**{counter: F(counter) - count})
+        released_audio_ids.extend(audio_id for _, audio_id in rows)
+    return released_audio_ids
@@ -0,0 +1,62 @@
+"""Denormalized counters kept on `Audio` and `Image`.
+
+The counters replace `Count()` annotations in the work-fetching views. They
+are kept up to date by the signals in `dashboard.signals`; the helpers here
+recompute them from the related tables to find and repair drift.
+"""
+from django.db.models import Count, F, Q
+
+# Counter field -> aggregate giving its true value.
+AUDIO_COUNTERS = {
+    "validation_count": Count("validations", filter=Q(validations__archived=False), distinct=True),
+    "transcription_count": Count("transcriptions", distinct=True),
+    "validation_assignment_count": Count("assignments", distinct=True),
+    "transcription_assignment_count": Count("transcriptions_assignments", distinct=True),
+    "resolution_assignment_count": Count("transcription_resolutions_assignments", distinct=True),
+}
+
+TRANSCRIPTION_LOCALES = ["ee_gh", "dag_gh", "dga_gh", "kpo_gh", "ak_gh"]
+
+IMAGE_COUNTERS = {
+    f"transcription_count_{locale}": Count(
+        "audios__transcriptions",
+        filter=Q(audios__locale=locale, audios__transcriptions__deleted=False),
+        distinct=True,
+    )
+    for locale in TRANSCRIPTION_LOCALES
+}
+IMAGE_VALIDATION_COUNTERS = ["validation_count", "valid_validation_count"]
+IMAGE_COUNTERS.update({
+    "validation_count": Count("validations", distinct=True),
+    "valid_validation_count": Count("validations", filter=Q(validations__is_valid=True), distinct=True),
+})
+
+CHUNK_SIZE = 5000
+
+
+def get_counter_drift(objects, counter, counters=AUDIO_COUNTERS):
+    """Yield (id, stored, actual) for objects whose counter is wrong."""
+    chunk_start = 0
+    objects = objects.order_by("id")
+    last = objects.last()
+    if not last:
+        return
+    while chunk_start <= last.id:
+        chunk = objects.filter(id__gte=chunk_start, id__lt=chunk_start + CHUNK_SIZE)\
+            .annotate(actual=counters[counter])\
+            .exclude(**{counter: F("actual")})\
+            .values_list("id", counter, "actual")
+        yield from chunk
+        chunk_start += CHUNK_SIZE
+
+
+def fix_counter_drift(objects, counter, counters=AUDIO_COUNTERS):
+    """Rewrite drifted values of a counter. Returns the number of objects fixed."""
+    drifted = {}
+    for object_id, _, actual in list(get_counter_drift(objects, counter, counters)):
+        drifted.setdefault(actual, []).append(object_id)
+
+    fixed = 0
+    for actual, object_ids in drifted.items():
+        fixed += objects.model.objects.filter(id__in=object_ids).update(**{counter: actual})
+    return fixed
@@ -0,0 +1,63 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.models import Audio
+from local_voice.utils.content_hash import hash_file
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = ("Compute the content hash of audios uploaded before it was stored. Audios left without a "
+            "hash, duplicates and missing files, are listed and make the command exit with status 1.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Stop after hashing this many audios.")
+        parser.add_argument("--report", help="Write the audios left without a hash to this CSV file.")
+
+    def handle(self, *args, **options):
+        audios = Audio.objects.filter(content_hash__isnull=True, deleted=False).order_by("id")
+        last_id = 0
+        hashed = 0
+        # [audio id, problem, detail] of the audios left without a hash.
+        unhashed = []
+        while options["limit"] is None or hashed < options["limit"]:
+            batch = list(audios.filter(id__gt=last_id).only("id", "file")[:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            hashes = {}
+            for audio in batch:
+                try:
+                    hashes[audio.id] = hash_file(audio.file)
+                except (OSError, ValueError) as e:
+                    unhashed.append([audio.id, "missing", str(e)])
+
+            # The first audio with some content keeps it; later copies are reported.
+            taken = dict(Audio.objects.filter(content_hash__in=hashes.values(), deleted=False)
+                         .values_list("content_hash", "id"))
+            for audio in batch:
+                content_hash = hashes.get(audio.id)
+                if content_hash is None:
+                    continue
+                if content_hash in taken:
+                    unhashed.append([audio.id, "duplicate", f"audio {taken[content_hash]}"])
+                    self.stdout.write(f"  audio {audio.id}: duplicate of audio {taken[content_hash]}")
+                    continue
+                taken[content_hash] = audio.id
+                Audio.objects.filter(id=audio.id).update(content_hash=content_hash)
+                hashed += 1
+
+        duplicates = sum(1 for _, problem, _ in unhashed if problem == "duplicate")
+        self.stdout.write(f"Hashed {hashed} audios; {len(unhashed) - duplicates} missing files, "
+                          f"{duplicates} duplicates.")
+        if options["report"]:
+            with open(options["report"], "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["audio_id", "problem", "detail"])
+                writer.writerows(unhashed)
+        if unhashed:
+            # These are hashed again on every run until deleted or fixed.
+            raise CommandError(f"{len(unhashed)} audios were left without a content hash.")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.counters import AUDIO_COUNTERS, fix_counter_drift
+from dashboard.models import Audio
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized work counters on audios."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--counter", choices=list(AUDIO_COUNTERS), help="Only backfill this counter.")
+        parser.add_argument("--locale", help="Only backfill audios of this locale.")
+
+    def handle(self, *args, **options):
+        audios = Audio.objects.all()
+        if options["locale"]:
+            audios = audios.filter(locale=options["locale"])
+
+        counters = [options["counter"]] if options["counter"] else AUDIO_COUNTERS
+        for counter in counters:
+            fixed = fix_counter_drift(audios, counter)
+            self.stdout.write(f"{counter}: updated {fixed} audios.")
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.counters import AUDIO_COUNTERS, get_counter_drift
+from dashboard.models import Audio
+
+
+class Command(BaseCommand):
+    help = "Report audios whose denormalized work counters have drifted."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--locale", help="Only check audios of this locale.")
+        parser.add_argument("--limit", type=int, default=20, help="Number of drifted audios to list per counter.")
+
+    def handle(self, *args, **options):
+        audios = Audio.objects.all()
+        if options["locale"]:
+            audios = audios.filter(locale=options["locale"])
+
+        total = 0
+        for counter in AUDIO_COUNTERS:
+            drifted = list(get_counter_drift(audios, counter))
+            total += len(drifted)
+            self.stdout.write(f"{counter}: {len(drifted)} drifted audios.")
+            for audio_id, stored, actual in drifted[:options["limit"]]:
+                self.stdout.write(f"  audio {audio_id}: stored {stored}, actual {actual}")
+
+        if total:
+            self.stdout.write(self.style.WARNING(
+                f"Found {total} drifted counters. Run backfill_audio_counters to repair them."))
+        else:
+            self.stdout.write(self.style.SUCCESS("All audio counters are consistent."))
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from PIL import UnidentifiedImageError
+
+from dashboard.models import Image
+from local_voice.utils import renditions
+
+BATCH_SIZE = 200
+
+
+class Command(BaseCommand):
+    help = "Create the renditions of images stored before they were made."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, help="Stop after this many images.")
+
+    def handle(self, *args, **options):
+        images = Image.objects.filter(renditions={}, deleted=False).exclude(file="").exclude(
+            file__isnull=True).order_by("id")
+        last_id = 0
+        created = failed = 0
+        while options["limit"] is None or created < options["limit"]:
+            batch = list(images.filter(id__gt=last_id).only("id", "name", "file", "thumbnail", "renditions")
+                         [:BATCH_SIZE])
+            if not batch:
+                break
+            last_id = batch[-1].id
+
+            for image in batch:
+                try:
+                    with image.file.open("rb") as f:
+                        image.set_renditions(renditions.open_image(f)[0])
+                except (OSError, ValueError, UnidentifiedImageError) as e:
+                    failed += 1
+                    self.stdout.write(f"  image {image.id}: {e}")
+                    continue
+                image.save(update_fields=["thumbnail", "renditions"], normal_save=True)
+                created += 1
+
+        self.stdout.write(f"Created the renditions of {created} images; {failed} failed.")
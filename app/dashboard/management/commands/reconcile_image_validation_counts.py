@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from dashboard.counters import (IMAGE_COUNTERS, IMAGE_VALIDATION_COUNTERS,
+                                fix_counter_drift, get_counter_drift)
+from dashboard.models import Image
+
+
+class Command(BaseCommand):
+    help = "Report and repair drift in the validation counters on images."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Only report drifted images.")
+
+    def handle(self, *args, **options):
+        images = Image.objects.all()
+        for counter in IMAGE_VALIDATION_COUNTERS:
+            if options["dry_run"]:
+                drifted = len(list(get_counter_drift(images, counter, IMAGE_COUNTERS)))
+                self.stdout.write(f"{counter}: {drifted} drifted images.")
+            else:
+                fixed = fix_counter_drift(images, counter, IMAGE_COUNTERS)
+                self.stdout.write(f"{counter}: updated {fixed} images.")
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:08
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_assignment_counters(apps, schema_editor):
+    Audio = apps.get_model("dashboard", "Audio")
+    relations = [
+        ("AudioValidationAssignment", "validation_assignment_count"),
+        ("AudioTranscriptionAssignment", "transcription_assignment_count"),
+        ("TranscriptionResolutionAssignment", "resolution_assignment_count"),
+    ]
+    for model_name, counter in relations:
+        through = apps.get_model("dashboard", model_name).audios.through
+        counts = through.objects.values("audio_id").annotate(total=Count("id"))
+        audio_ids_by_count = {}
+        for item in counts:
+            audio_ids_by_count.setdefault(item["total"], []).append(item["audio_id"])
+        for total, audio_ids in audio_ids_by_count.items():
+            Audio.objects.filter(id__in=audio_ids).update(**{counter: total})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0044_image_image_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='resolution_assignment_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='transcription_assignment_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='validation_assignment_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.AlterField(
+            model_name='audio',
+            name='transcription_count',
+            field=models.IntegerField(db_index=True, default=0),
+        ),
+        migrations.RunPython(backfill_assignment_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:10
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('dashboard', '0045_audio_resolution_assignment_count_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='lease_expires_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='leased_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='leased_audios', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
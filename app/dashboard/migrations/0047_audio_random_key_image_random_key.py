@@ -0,0 +1,32 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:13
+
+from django.db import migrations, models
+from django.db.models.functions import Random
+import local_voice.utils.sampling
+
+
+def backfill_random_keys(apps, schema_editor):
+    # AddField gives every existing row the same default value.
+    for model_name in ["Audio", "Image"]:
+        apps.get_model("dashboard", model_name).objects.update(random_key=Random())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0046_audio_lease_expires_at_audio_leased_by'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='random_key',
+            field=models.FloatField(db_index=True, default=local_voice.utils.sampling.new_random_key),
+        ),
+        migrations.AddField(
+            model_name='image',
+            name='random_key',
+            field=models.FloatField(db_index=True, default=local_voice.utils.sampling.new_random_key),
+        ),
+        migrations.RunPython(backfill_random_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def backfill_assigned_at(apps, schema_editor):
+    # Existing audios keep expiring with the assignment they belong to.
+    for model_name in ["AudioValidationAssignment", "AudioTranscriptionAssignment",
+                       "TranscriptionResolutionAssignment"]:
+        through = apps.get_model("dashboard", model_name).audios.through
+        assignment_field = model_name.lower()
+        through.objects.update(assigned_at=models.Subquery(
+            apps.get_model("dashboard", model_name).objects.filter(
+                id=models.OuterRef(f"{assignment_field}_id")).values("created_at")[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0047_audio_random_key_image_random_key'),
+    ]
+
+    operations = [
+        # The tables already exist as the auto-created through tables.
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='TranscriptionResolutionAssignmentAudio',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('audio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.audio')),
+                        ('transcriptionresolutionassignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.transcriptionresolutionassignment')),
+                    ],
+                    options={
+                        'db_table': 'dashboard_transcriptionresolutionassignment_audios',
+                        'unique_together': {('transcriptionresolutionassignment', 'audio')},
+                    },
+                ),
+                migrations.CreateModel(
+                    name='AudioValidationAssignmentAudio',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('audio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.audio')),
+                        ('audiovalidationassignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.audiovalidationassignment')),
+                    ],
+                    options={
+                        'db_table': 'dashboard_audiovalidationassignment_audios',
+                        'unique_together': {('audiovalidationassignment', 'audio')},
+                    },
+                ),
+                migrations.CreateModel(
+                    name='AudioTranscriptionAssignmentAudio',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('audio', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.audio')),
+                        ('audiotranscriptionassignment', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='dashboard.audiotranscriptionassignment')),
+                    ],
+                    options={
+                        'db_table': 'dashboard_audiotranscriptionassignment_audios',
+                        'unique_together': {('audiotranscriptionassignment', 'audio')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='audiotranscriptionassignment',
+                    name='audios',
+                    field=models.ManyToManyField(db_index=True, related_name='transcriptions_assignments', through='dashboard.AudioTranscriptionAssignmentAudio', to='dashboard.audio'),
+                ),
+                migrations.AlterField(
+                    model_name='audiovalidationassignment',
+                    name='audios',
+                    field=models.ManyToManyField(db_index=True, related_name='assignments', through='dashboard.AudioValidationAssignmentAudio', to='dashboard.audio'),
+                ),
+                migrations.AlterField(
+                    model_name='transcriptionresolutionassignment',
+                    name='audios',
+                    field=models.ManyToManyField(db_index=True, related_name='transcription_resolutions_assignments', through='dashboard.TranscriptionResolutionAssignmentAudio', to='dashboard.audio'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='audiovalidationassignmentaudio',
+            name='assigned_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='audiotranscriptionassignmentaudio',
+            name='assigned_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='transcriptionresolutionassignmentaudio',
+            name='assigned_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_assigned_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:21
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_batch_users(apps, schema_editor):
+    User = apps.get_model("accounts", "User")
+    ImageBatch = apps.get_model("dashboard", "ImageBatch")
+    counts = User.objects.filter(assigned_image_batch__gt=0).values(
+        "assigned_image_batch").annotate(total=Count("id"))
+    ImageBatch.objects.bulk_create([
+        ImageBatch(number=item["assigned_image_batch"], user_count=item["total"])
+        for item in counts
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0022_user_archived'),
+        ('dashboard', '0048_assignment_through_models'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImageBatch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.IntegerField(unique=True)),
+                ('user_count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'image_batches',
+            },
+        ),
+        migrations.RunPython(count_batch_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:29
+
+import hashlib
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def backfill_text_fingerprints(apps, schema_editor):
+    Transcription = apps.get_model("dashboard", "Transcription")
+    transcriptions = Transcription.objects.only("id", "text").order_by("id")
+    last_id = 0
+    while True:
+        batch = list(transcriptions.filter(id__gt=last_id)[:BATCH_SIZE])
+        if not batch:
+            break
+        for transcription in batch:
+            text = " ".join(transcription.text.lower().split())
+            transcription.text_fingerprint = hashlib.sha1(text.encode()).hexdigest()
+        Transcription.objects.bulk_update(batch, ["text_fingerprint"])
+        last_id = batch[-1].id
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0049_imagebatch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcription',
+            name='text_fingerprint',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40),
+        ),
+        migrations.RunPython(backfill_text_fingerprints, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:31
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_validation_counts(apps, schema_editor):
+    Image = apps.get_model("dashboard", "Image")
+    counts = Image.objects.filter(validations__isnull=False).values("id").annotate(
+        total=Count("validations", distinct=True),
+        valid=Count("validations", filter=Q(validations__is_valid=True), distinct=True),
+    ).values_list("id", "total", "valid")
+
+    image_ids_by_counts = {}
+    for image_id, total, valid in counts:
+        image_ids_by_counts.setdefault((total, valid), []).append(image_id)
+    for (total, valid), image_ids in image_ids_by_counts.items():
+        Image.objects.filter(id__in=image_ids).update(validation_count=total, valid_validation_count=valid)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0050_transcription_text_fingerprint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='image',
+            name='valid_validation_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_validation_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0051_image_valid_validation_count'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='content_hash',
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='audio',
+            constraint=models.UniqueConstraint(condition=models.Q(('deleted', False)), fields=('content_hash',), name='unique_active_audio_content_hash'),
+        ),
+    ]
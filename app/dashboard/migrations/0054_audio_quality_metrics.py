@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-18 10:43
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0053_uploadsession'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audio',
+            name='clipping_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='noise_floor',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='quality_flagged',
+            field=models.BooleanField(db_index=True, default=False),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='rms_level',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='silence_ratio',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='audio',
+            name='true_duration',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
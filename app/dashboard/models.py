@@ -1,23 +1,42 @@
 import decimal
+import hashlib
+import logging
 import os
-from datetime import datetime
+import uuid
+from datetime import datetime, timedelta
 from functools import reduce
 from io import BytesIO
 
+import redis
 import requests
-from django.core.files import File
+from django.conf import settings
 from django.core.files.base import ContentFile
-from django.db import models
-from django.db.models import Q
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
 from PIL import Image as PillowImage
+from redis.exceptions import RedisError
 from PIL import UnidentifiedImageError
 
 from accounts.models import User
+from local_voice.utils import (crawler, renditions, upload_ingest,
+                               validation_queue)
 from local_voice.utils.constants import (ParticipantType, TransactionDirection,
                                          TranscriptionStatus, ValidationStatus)
+from local_voice.utils.file_tracking import FileTrackingMixin
+from local_voice.utils.sampling import new_random_key
 from payments.models import Transaction
 from setup.models import AppConfiguration
 
+logger = logging.getLogger("app")
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+# Bumped on every category change so each process knows when to reload its ids.
+CATEGORY_VERSION_KEY = "category_version"
+_cached_category_ids = {}
+
 
 class Notification(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -46,6 +65,36 @@ class Category(models.Model):
     def __str__(self):
         return self.name
 
+    @staticmethod
+    def get_ids_by_name(names):
+        """
+        Return {name: id} for the existing categories among `names`, from the
+        mapping of all categories held by this process. The mapping is reloaded
+        once the version in Redis changed, or when a name is unknown. Reads the
+        database when Redis is unavailable.
+        """
+        try:
+            version = redis_client.get(CATEGORY_VERSION_KEY)
+        except RedisError as e:
+            logger.error(f"Category version lookup failed: {e}")
+            return dict(Category.objects.filter(name__in=names).values_list("name", "id"))
+
+        ids_by_name = _cached_category_ids.get("ids_by_name")
+        if ids_by_name is None or _cached_category_ids.get("version") != version \
+                or any(name not in ids_by_name for name in names):
+            # The version is read first, so a concurrent change triggers another reload.
+            ids_by_name = dict(Category.objects.values_list("name", "id"))
+            _cached_category_ids.update(ids_by_name=ids_by_name, version=version)
+        return {name: ids_by_name[name] for name in names if name in ids_by_name}
+
+    @staticmethod
+    def invalidate_cache():
+        _cached_category_ids.clear()
+        try:
+            redis_client.incr(CATEGORY_VERSION_KEY)
+        except RedisError as e:
+            logger.error(f"Category version update failed: {e}")
+
 
 class Validation(models.Model):
     user = models.ForeignKey(User, related_name="validations", on_delete=models.PROTECT)
@@ -62,7 +111,7 @@ class Validation(models.Model):
         return f'{self.user} - {self.is_valid}'
 
 
-class Image(models.Model):
+class Image(FileTrackingMixin, models.Model):
     name = models.CharField(max_length=255, unique=True)
     image_id = models.IntegerField(unique=True, db_index=True, null=True)
     main_category = models.ForeignKey(Category, related_name="main_images", on_delete=models.SET_NULL, null=True, blank=True)
@@ -73,9 +122,12 @@ class Image(models.Model):
     is_accepted = models.BooleanField(default=False, db_index=True)
     is_downloaded = models.BooleanField(default=False)
     validation_count = models.IntegerField(default=0)
+    valid_validation_count = models.IntegerField(default=0)
     validated = models.BooleanField(default=False)
     thumbnail = models.ImageField(
         upload_to='thumbnails/', blank=True, null=True)
+    # {"<size>.<extension>": file name} of the renditions besides the thumbnail.
+    renditions = models.JSONField(default=dict, blank=True)
     validations = models.ManyToManyField(
         Validation, related_name='image_validations', blank=True)
     batch_number = models.IntegerField(
@@ -88,6 +140,19 @@ class Image(models.Model):
     transcription_count_dga_gh = models.IntegerField(default=0)
     transcription_count_kpo_gh = models.IntegerField(default=0)
     transcription_count_ak_gh = models.IntegerField(default=0)
+    random_key = models.FloatField(default=new_random_key, db_index=True)
+
+    tracked_file_fields = ["file", "thumbnail"]
+
+    TRANSCRIPTION_COUNTER_FIELDS = [
+        "transcription_count_ee_gh",
+        "transcription_count_dag_gh",
+        "transcription_count_dga_gh",
+        "transcription_count_kpo_gh",
+        "transcription_count_ak_gh",
+    ]
+    # Fields only ever written with targeted UPDATE queries.
+    UPDATE_MANAGED_FIELDS = TRANSCRIPTION_COUNTER_FIELDS + ["valid_validation_count"]
 
     class Meta:
         db_table = "images"
@@ -109,94 +174,219 @@ class Image(models.Model):
 
             if self.validation_count > 0:
                 self.validated = True
+
+        # Counters are maintained with targeted updates; a full save must not
+        # write back the values loaded with this instance.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.UPDATE_MANAGED_FIELDS
+            ]
         return super().save(*args, **kwargs)
 
+    @staticmethod
+    def update_transcription_counts(audio_ids, delta):
+        """
+        Add `delta` to the per-locale transcription counters of the images
+        of the given audios, once per transcription of each audio listed.
+        """
+        occurrences = {}
+        for audio_id in audio_ids:
+            occurrences[audio_id] = occurrences.get(audio_id, 0) + 1
+
+        counts = {}
+        audios = Audio.objects.filter(id__in=occurrences.keys()).values_list("id", "image_id", "locale")
+        for audio_id, image_id, locale in audios:
+            if f"transcription_count_{locale}" in Image.TRANSCRIPTION_COUNTER_FIELDS:
+                key = (image_id, locale)
+                counts[key] = counts.get(key, 0) + occurrences[audio_id]
+
+        image_ids_by_change = {}
+        for (image_id, locale), count in counts.items():
+            image_ids_by_change.setdefault((locale, count * delta), []).append(image_id)
+        for (locale, change), image_ids in image_ids_by_change.items():
+            counter = f"transcription_count_{locale}"
+            Image.objects.filter(id__in=image_ids).update(**{counter: F(counter) + change})
+
     def format_image_name(self):
         cat_name = self.main_category.name.split()[0].replace(",", "").lower() + "_" if self.main_category else "1"
         new_filename = cat_name + f"{self.id}".zfill(6) + ".jpg"
-        image = PillowImage.open(self.file)
-        temp_io = BytesIO()
-        image = image.convert("RGB")
-        image.save(temp_io, "jpeg")
-        self.file = File(temp_io,new_filename)
+        # JPEG files are copied as they are; only other formats are re-encoded.
+        with self.file.open("rb") as f:
+            image = PillowImage.open(f)
+            if image.format == "JPEG":
+                f.seek(0)
+                content = f.read()
+            else:
+                temp_io = BytesIO()
+                image.convert("RGB").save(temp_io, "jpeg")
+                content = temp_io.getvalue()
+        self.file = ContentFile(content, name=new_filename)
         self.name = new_filename
 
-        # Rename thumbnail
-        new_filename = "2" + f"{self.id}".zfill(9) + ".jpg"
-        image = PillowImage.open(self.thumbnail)
-        temp_io = BytesIO()
-        image = image.convert("RGB")
-        image.save(temp_io, "jpeg")
-        self.thumbnail = File(temp_io,new_filename)
-        self.save()
-
-    def validate(self, user, status, category_names):
-        required_image_validation_count = AppConfiguration.objects.first(
-        ).required_image_validation_count
-        max_categories_for_image = AppConfiguration.objects.first().max_category_for_image
-
-        categories = self.categories.union(Category.objects.filter(
-            name__in=category_names))[:max_categories_for_image]
-        self.categories.set(categories)
-
-        validation = Validation.objects.filter(
-            user=user, image_validations=self).first()
-        if validation is None:
-            validation = Validation.objects.create(user=user)
-        validation.is_valid = status == "accepted"
-        self.validations.add(validation)
-        validation.save()
+        # Rename thumbnail, which is always a JPEG.
+        if self.thumbnail:
+            new_filename = "2" + f"{self.id}".zfill(9) + ".jpg"
+            with self.thumbnail.open("rb") as f:
+                self.thumbnail = ContentFile(f.read(), name=new_filename)
         self.save()
 
-        is_accepted = self.validation_count >= required_image_validation_count and self.validation_count == self.validations.filter(
-            is_valid=True).count() and len(categories) > 0
-        self.is_accepted = is_accepted
+    def set_renditions(self, image):
+        """
+        Store the renditions of `image`, opened with
+        `renditions.open_image`, and record them on this image. The smallest
+        JPEG one becomes the thumbnail, saved with the image.
+        """
+        stem = os.path.splitext(os.path.basename(self.name))[0]
+        names = {}
+        for key, content in renditions.make_renditions(image).items():
+            if key == renditions.THUMBNAIL_RENDITION:
+                self.thumbnail = ContentFile(content, name=f"{stem}.jpg")
+            else:
+                size, extension = key.split(".")
+                names[key] = default_storage.save(f"renditions/{stem}_{size}.{extension}", ContentFile(content))
+        self._replaced_renditions = list(self.renditions.values())
+        self.renditions = names
+
+    def get_renditions(self):
+        """Return {rendition key: file name}, including the thumbnail."""
+        names = dict(self.renditions)
+        if self.thumbnail:
+            names[renditions.THUMBNAIL_RENDITION] = self.thumbnail.name
+        return names
+
+    def pop_replaced_files(self, update_fields=None):
+        replaced = super().pop_replaced_files(update_fields)
+        if update_fields is None or "renditions" in update_fields:
+            replaced += getattr(self, "_replaced_renditions", [])
+            self._replaced_renditions = []
+        return replaced
 
-        if is_accepted:
-            self.main_category = Category.objects.filter(name=category_names[0]).first()
-        else:
-            self.main_category = None
-        self.save()
-
-    def create_image_thumbnail(self, height=200, width=200):
-        thumbnail = PillowImage.open(self.file)
-        thumbnail.thumbnail((height, width), PillowImage.ANTIALIAS)
-        thumb_io = BytesIO()
-        thumbnail = thumbnail.convert('RGB')
-        thumbnail.save(thumb_io, "jpeg", quality=80)
-        self.thumbnail = File(
-            thumb_io, name=self.name.split(".")[0] + ".jpg")
+    def validate(self, user, status, category_names):
+        """
+        Record the decision of `user` on this image and the categories they
+        picked in one transaction, deciding acceptance from the maintained
+        validation counters.
+        """
+        configuration = AppConfiguration.get_cached()
+        required_image_validation_count = configuration.required_image_validation_count if configuration else 3
+        max_categories_for_image = configuration.max_category_for_image if configuration else 5
+        category_names = category_names or []
+        category_ids = Category.get_ids_by_name(category_names)
+        is_valid = status == "accepted"
+
+        with transaction.atomic():
+            # Serializes concurrent validations of the image.
+            image = Image.objects.select_for_update().only(
+                "validation_count", "valid_validation_count").get(id=self.id)
+            validation_count = image.validation_count
+            valid_validation_count = image.valid_validation_count
+
+            validation = Validation.objects.filter(user=user, image_validations=self)\
+                .only("id", "is_valid").first()
+            if validation is None:
+                validation = Validation.objects.create(user=user, is_valid=is_valid)
+                Image.validations.through.objects.create(image_id=self.id, validation_id=validation.id)
+                validation_count += 1
+                valid_validation_count += int(is_valid)
+            elif validation.is_valid != is_valid:
+                Validation.objects.filter(id=validation.id).update(is_valid=is_valid, updated_at=timezone.now())
+                valid_validation_count += 1 if is_valid else -1
+
+            current_category_ids = list(
+                Image.categories.through.objects.filter(image_id=self.id).values_list("category_id", flat=True))
+            new_category_ids = [
+                category_id for category_id in dict.fromkeys(category_ids.values())
+                if category_id not in current_category_ids
+            ][:max(max_categories_for_image - len(current_category_ids), 0)]
+            Image.categories.through.objects.bulk_create([
+                Image.categories.through(image_id=self.id, category_id=category_id)
+                for category_id in new_category_ids
+            ])
+
+            self.validation_count = validation_count
+            self.valid_validation_count = valid_validation_count
+            self.validated = validation_count > 0
+            self.is_accepted = validation_count >= required_image_validation_count\
+                and valid_validation_count == validation_count\
+                and bool(current_category_ids or new_category_ids)
+            self.main_category_id = category_ids.get(category_names[0]) if self.is_accepted and category_names else None
+            Image.objects.filter(id=self.id).update(validation_count=self.validation_count,
+                                                    valid_validation_count=self.valid_validation_count,
+                                                    validated=self.validated,
+                                                    is_accepted=self.is_accepted,
+                                                    main_category_id=self.main_category_id,
+                                                    updated_at=timezone.now())
+
+    def create_renditions(self):
+        with self.file.open("rb") as f:
+            image, _ = renditions.open_image(f)
+            self.set_renditions(image)
         self.save(normal_save=True)
 
     def download(self):
         if self.is_downloaded:
             return
 
-        response = requests.get(self.source_url)
+        response = requests.get(self.source_url, timeout=crawler.FETCH_TIMEOUT)
         if response.status_code != requests.codes.ok:
             return
 
         try:
-            image = PillowImage.open(BytesIO(response.content))
-            width, height = image.size
+            image, (width, height) = renditions.open_image(BytesIO(response.content))
             if width >= 400 and height >= 400:
-                self.file.save(self.name, ContentFile(response.content))
-
-                # Create thumbnail
-                thumbnail = PillowImage.open(BytesIO(response.content))
-                thumbnail.thumbnail((200, 200), PillowImage.ANTIALIAS)
-                thumb_io = BytesIO()
-                thumbnail = thumbnail.convert('RGB')
-                thumbnail.save(thumb_io, "jpeg", quality=50)
-                self.thumbnail = File(
-                    thumb_io, name=self.name.split(".")[0] + ".jpg")
-
+                self.file.save(self.name, ContentFile(response.content), save=False)
+                self.set_renditions(image)
                 self.is_downloaded = True
                 self.save()
         except (UnidentifiedImageError) as e:
             print(e)
 
 
+class ImageBatch(models.Model):
+    """Number of users assigned to each image batch, used to balance new users."""
+    number = models.IntegerField(unique=True)
+    user_count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = "image_batches"
+
+    def __str__(self):
+        return f"Batch {self.number}: {self.user_count} users"
+
+    @staticmethod
+    def set_counts(counts):
+        """Store {batch number: user count}, dropping batches not listed."""
+        batches = {batch.number: batch for batch in ImageBatch.objects.all()}
+        for number, user_count in counts.items():
+            batches.setdefault(number, ImageBatch(number=number)).user_count = user_count
+        ImageBatch.objects.exclude(number__in=counts.keys()).delete()
+        ImageBatch.objects.bulk_create([batch for batch in batches.values() if batch.pk is None])
+        ImageBatch.objects.bulk_update([batch for batch in batches.values()
+                                        if batch.pk is not None and batch.number in counts], ["user_count"])
+
+    @staticmethod
+    def reconcile(number_of_batches):
+        """Recount the users of batches 1 to `number_of_batches`."""
+        counts = dict(User.objects.filter(
+            assigned_image_batch__gt=0,
+            assigned_image_batch__lte=number_of_batches).values_list("assigned_image_batch")
+            .annotate(total=Count("id")).values_list("assigned_image_batch", "total"))
+        ImageBatch.set_counts({number: counts.get(number, 0) for number in range(1, number_of_batches + 1)})
+
+    @staticmethod
+    def take_least_used(number_of_batches):
+        """Count one more user in the least used batch and return its number."""
+        batches = ImageBatch.objects.filter(number__gte=1, number__lte=number_of_batches)
+        if batches.count() < number_of_batches:
+            ImageBatch.reconcile(number_of_batches)
+        batch = batches.order_by("user_count", "number").first()
+        if batch is None:
+            return 1
+        ImageBatch.objects.filter(id=batch.id).update(user_count=F("user_count") + 1)
+        return batch.number
+
+
 class Participant(models.Model):
     PARTICIPANT_TYPES = [
         (ParticipantType.INDEPENDENT.value,ParticipantType.INDEPENDENT.value),
@@ -296,7 +486,7 @@ class Participant(models.Model):
         return self.slug
 
 
-class Audio(models.Model):
+class Audio(FileTrackingMixin, models.Model):
     AUDIO_STATUS_CHOICES = [
         (ValidationStatus.IN_REVIEW.value,ValidationStatus.IN_REVIEW.value),
         (ValidationStatus.ACCEPTED.value,ValidationStatus.ACCEPTED.value),
@@ -312,7 +502,10 @@ class Audio(models.Model):
     participant = models.ForeignKey(Participant, related_name="audios", on_delete=models.PROTECT, null=True, blank=True)
     device_id = models.CharField(max_length=255, blank=True, null=True)
     validation_count = models.IntegerField(default=0, db_index=True)
-    transcription_count = models.IntegerField(default=0)
+    transcription_count = models.IntegerField(default=0, db_index=True)
+    validation_assignment_count = models.IntegerField(default=0, db_index=True)
+    transcription_assignment_count = models.IntegerField(default=0, db_index=True)
+    resolution_assignment_count = models.IntegerField(default=0, db_index=True)
     year = models.IntegerField(blank=True, default=2023, null=True)
     locale = models.CharField(max_length=255, blank=True, null=True, db_index=True)
     api_client = models.CharField(max_length=255, blank=True, null=True)
@@ -330,9 +523,40 @@ class Audio(models.Model):
     checked_in_for_transcription = models.BooleanField(default=False, db_index=True)
     note = models.CharField(max_length=200, null=True, blank=True)
     second_audio_status = models.TextField(choices=AUDIO_STATUS_CHOICES, default=ValidationStatus.PENDING.value, db_index=True)
+    leased_by = models.ForeignKey(User, related_name="leased_audios", on_delete=models.SET_NULL, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    random_key = models.FloatField(default=new_random_key, db_index=True)
+    # SHA-256 of the uploaded file, unique among audios that are not deleted.
+    content_hash = models.CharField(max_length=64, null=True, blank=True)
+    # Quality metrics measured on ingest; levels in dBFS, durations in seconds.
+    rms_level = models.FloatField(null=True, blank=True)
+    noise_floor = models.FloatField(null=True, blank=True)
+    clipping_ratio = models.FloatField(null=True, blank=True)
+    silence_ratio = models.FloatField(null=True, blank=True)
+    true_duration = models.FloatField(null=True, blank=True)
+    # Borderline quality; validated after the other audios.
+    quality_flagged = models.BooleanField(default=False, db_index=True)
+
+    tracked_file_fields = ["file", "file_mp3"]
+
+    # Number of candidates tried when another worker wins the race for a lease.
+    LEASE_CANDIDATES = 10
+
+    ASSIGNMENT_COUNTER_FIELDS = [
+        "validation_assignment_count",
+        "transcription_assignment_count",
+        "resolution_assignment_count",
+    ]
+    # Fields only ever written with targeted UPDATE queries.
+    UPDATE_MANAGED_FIELDS = ASSIGNMENT_COUNTER_FIELDS + ["leased_by", "lease_expires_at"]
 
     class Meta:
         db_table = "audios"
+        constraints = [
+            models.UniqueConstraint(fields=["content_hash"],
+                                    condition=Q(deleted=False),
+                                    name="unique_active_audio_content_hash"),
+        ]
 
     def __str__(self):
         return f'{self.image.name} - {self.submitted_by}'
@@ -344,7 +568,8 @@ class Audio(models.Model):
             return request.build_absolute_uri(self.file.url)
 
     def save(self, *args, **kwargs) -> None:
-        if self.pk is not None:
+        # Saves of a few fields do not write the recounted values back.
+        if self.pk is not None and kwargs.get("update_fields") is None:
             self.validation_count = self.validations.filter(archived=False).count()
             self.transcription_count = self.transcriptions.filter().count()
             self.year = datetime.now().year
@@ -353,6 +578,14 @@ class Audio(models.Model):
             self.main_file_format = "mp3"
         else:
             self.main_file_format = "wav"
+
+        # Counters and leases are maintained with targeted updates; a full
+        # save must not write back the values loaded with this instance.
+        if not self._state.adding and kwargs.get("update_fields") is None:
+            kwargs["update_fields"] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.UPDATE_MANAGED_FIELDS
+            ]
         return super().save(*args, **kwargs)
 
     @staticmethod
@@ -363,51 +596,137 @@ class Audio(models.Model):
         return reduce(lambda x, y: x | y, queries)
 
     def validate(self, user, status):
-        validation = Validation.objects.filter(archived=False, user=user, audio_validations=self).first()
-        if validation is None:
-            validation = Validation.objects.create(user=user)
-        validation.is_valid = status == "accepted"
-        validation.save()
-        self.validations.add(validation)
-        self.save()
+        """
+        Record the decision of `user` on this audio with a fixed number of
+        queries, whatever the number of existing validations.
+        """
+        configuration = AppConfiguration.get_cached()
+        required_audio_validation_count = configuration.required_audio_validation_count if configuration else 2
+        with transaction.atomic():
+            Audio.record_validations(user, {self.id: status}, required_audio_validation_count)
+        validation_queue.refresh([self.id], required_audio_validation_count)
 
-        # OLD METHODOLOGY
-        # is_accepted = self.validation_count >= required_audio_validation_count and self.validations.filter(
-        #     is_valid=True).count() == self.validation_count
-        # self.is_accepted = is_accepted
-
-        # # self.is_accepted and self.rejected will be removed in the future
-        # rejected = self.validation_count >= required_audio_validation_count and self.validations.filter(
-        #     is_valid=False).count() == self.validation_count
-        # self.rejected = rejected
-
-        # if is_accepted:
-        #     self.audio_status = ValidationStatus.ACCEPTED.value
-        # elif rejected:
-        #     self.audio_status = ValidationStatus.REJECTED.value
-        # else:
-        #     self.audio_status = ValidationStatus.PENDING.value
-        # self.save()
-
-        # NEW METHODOLOGY
-        self.update_validation()
-
-    def update_validation(self):
-        required_audio_validation_count = AppConfiguration.objects.first(
-        ).required_audio_validation_count
-        
-        is_accepted = self.validation_count >= required_audio_validation_count and self.validations.filter(archived=False, is_valid=True).count() >= self.validation_count
-        rejected = self.validation_count >= required_audio_validation_count and self.validations.filter(
-            archived=False,
-            is_valid=False).count() >= self.validation_count
-        
-        if is_accepted:
-            self.second_audio_status = ValidationStatus.ACCEPTED.value
-        elif rejected:
-            self.second_audio_status = ValidationStatus.REJECTED.value
-        else:
-            self.second_audio_status = ValidationStatus.PENDING.value
-        self.save()
+    @staticmethod
+    def get_validation_status(validation_count, valid_count, invalid_count, required_audio_validation_count):
+        if validation_count >= required_audio_validation_count and valid_count >= validation_count:
+            return ValidationStatus.ACCEPTED.value
+        if validation_count >= required_audio_validation_count and invalid_count >= validation_count:
+            return ValidationStatus.REJECTED.value
+        return ValidationStatus.PENDING.value
+
+    @staticmethod
+    def update_validations(audio_ids, required_audio_validation_count):
+        """Recompute the validation status of many audios with one query per status."""
+        audios = Audio.objects.filter(id__in=audio_ids).annotate(
+            active_count=Count("validations", filter=Q(validations__archived=False)),
+            valid_count=Count("validations", filter=Q(validations__archived=False, validations__is_valid=True)),
+            invalid_count=Count("validations", filter=Q(validations__archived=False, validations__is_valid=False)),
+        ).values_list("id", "active_count", "valid_count", "invalid_count")
+
+        audio_ids_by_status = {}
+        for audio_id, active_count, valid_count, invalid_count in audios:
+            status = Audio.get_validation_status(active_count, valid_count, invalid_count,
+                                                 required_audio_validation_count)
+            audio_ids_by_status.setdefault(status, []).append(audio_id)
+        for status, ids in audio_ids_by_status.items():
+            Audio.objects.filter(id__in=ids).update(second_audio_status=status, updated_at=timezone.now())
+
+    @staticmethod
+    def bulk_validate(user, statuses):
+        """
+        Record the validations of `user` given as {audio_id: status}, with the
+        eligibility checks, writes and status updates done once for the batch.
+        Returns {audio_id: result}.
+        """
+        configuration = AppConfiguration.get_cached()
+        required_audio_validation_count = configuration.required_audio_validation_count if configuration else 2
+
+        results = {audio_id: "unavailable" for audio_id in statuses}
+        audio_ids = list(Audio.objects.filter(
+            id__in=statuses.keys(),
+            deleted=False,
+            validation_count__lt=required_audio_validation_count,
+        ).exclude(second_audio_status__in=[ValidationStatus.ACCEPTED.value, ValidationStatus.REJECTED.value])
+            .values_list("id", flat=True))
+        if not audio_ids:
+            return results
+
+        with transaction.atomic():
+            updated_audio_ids = Audio.record_validations(
+                user, {audio_id: statuses[audio_id] for audio_id in audio_ids},
+                required_audio_validation_count)
+        validation_queue.refresh(audio_ids, required_audio_validation_count)
+
+        for audio_id in audio_ids:
+            results[audio_id] = "updated" if audio_id in updated_audio_ids else "recorded"
+        return results
+
+    @staticmethod
+    def record_validations(user, statuses, required_audio_validation_count):
+        """
+        Write the validations of `user` given as {audio_id: status} and update
+        the audios' counters and statuses. Callers check eligibility and run
+        this in a transaction. Returns the ids of audios the user had already
+        validated.
+        """
+        through = Audio.validations.through
+        existing = dict(through.objects.filter(
+            audio_id__in=statuses.keys(), validation__user=user, validation__archived=False)
+            .values_list("audio_id", "validation_id"))
+        for is_valid in [True, False]:
+            validation_ids = [validation_id for audio_id, validation_id in existing.items()
+                              if (statuses[audio_id] == ValidationStatus.ACCEPTED.value) == is_valid]
+            if validation_ids:
+                Validation.objects.filter(id__in=validation_ids).update(is_valid=is_valid,
+                                                                        updated_at=timezone.now())
+
+        # Rows added in bulk bypass m2m_changed, so the counter is updated here.
+        new_audio_ids = [audio_id for audio_id in statuses if audio_id not in existing]
+        if new_audio_ids:
+            validations = Validation.objects.bulk_create([
+                Validation(user=user, is_valid=statuses[audio_id] == ValidationStatus.ACCEPTED.value)
+                for audio_id in new_audio_ids
+            ])
+            through.objects.bulk_create([
+                through(audio_id=audio_id, validation_id=validation.id)
+                for audio_id, validation in zip(new_audio_ids, validations)
+            ])
+            Audio.objects.filter(id__in=new_audio_ids).update(validation_count=F("validation_count") + 1)
+
+        Audio.update_validations(list(statuses), required_audio_validation_count)
+        return set(existing)
+
+    @staticmethod
+    def free_of_lease(user):
+        return Q(lease_expires_at=None) | Q(lease_expires_at__lte=timezone.now()) | Q(leased_by=user)
+
+    @staticmethod
+    def claim(audios, user, minutes):
+        """
+        Lease the first audio of `audios` not leased by someone else to `user`
+        for `minutes`. Rows locked by concurrent claims are skipped on
+        databases supporting SKIP LOCKED; elsewhere the conditional update
+        decides which claim wins.
+        """
+        expiry = timezone.now() + timedelta(minutes=minutes)
+        with transaction.atomic():
+            candidates = audios.filter(Audio.free_of_lease(user))\
+                .select_for_update(skip_locked=True, of=("self",))[:Audio.LEASE_CANDIDATES]
+            for audio in candidates:
+                claimed = Audio.objects.filter(Audio.free_of_lease(user), id=audio.id)\
+                    .update(leased_by=user, lease_expires_at=expiry)
+                if claimed:
+                    audio.leased_by = user
+                    audio.lease_expires_at = expiry
+                    return audio
+        return None
+
+    def release_lease(self, user):
+        Audio.release_leases([self.id], user)
+
+    @staticmethod
+    def release_leases(audio_ids, user):
+        Audio.objects.filter(id__in=audio_ids, leased_by=user).update(leased_by=None, lease_expires_at=None)
 
     def get_transcriptions(self):
         if not hasattr(self, "transcriptions"):
@@ -437,10 +756,19 @@ class Transcription(models.Model):
     deleted = models.BooleanField(default=False)
     conflict_resolved_by = models.ForeignKey(User, related_name="transcription_resolutions", on_delete=models.PROTECT, default=None, null=True, blank=True, db_index=True)
     transcription_status = models.CharField(max_length=100, choices=TRANSCRIPTION_STATUS_CHOICES, default=ValidationStatus.PENDING.value, db_index=True)
+    # Hash of the case-insensitive text, for checking agreement in SQL.
+    text_fingerprint = models.CharField(max_length=40, blank=True, default="", db_index=True)
 
     class Meta:
         db_table = "transcriptions"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Lets the image counters follow soft deletes without reading the row again.
+        instance._original_deleted = instance.__dict__.get("deleted")
+        return instance
+
     def get_text(self):
         return self.corrected_text or self.text
 
@@ -450,20 +778,84 @@ class Transcription(models.Model):
                    for key in ["audio__environment", "user__email_address", "audio__locale"]]
         return reduce(lambda x, y: x | y, queries)
 
+    @staticmethod
+    def normalize_text(text):
+        return " ".join(text.replace("\r", " ").replace("\n", " ").split())
+
+    @staticmethod
+    def fingerprint_text(text):
+        return hashlib.sha1(" ".join(text.lower().split()).encode()).hexdigest()
+
     def save(self, *args, **kwargs) -> None:
-        self.text = " ".join(self.text.replace("\r", " ").replace("\n", " ").split())
+        self.text = Transcription.normalize_text(self.text)
+        self.text_fingerprint = Transcription.fingerprint_text(self.text)
+        if kwargs.get("update_fields") is not None and "text" in kwargs["update_fields"]:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"text_fingerprint"}
 
         if self.corrected_text:
-            self.corrected_text = " ".join(self.corrected_text.replace("\r", " ").replace("\n", " ").split())
+            self.corrected_text = Transcription.normalize_text(self.corrected_text)
             self.transcription_status = TranscriptionStatus.ACCEPTED.value
 
         if self.pk is not None:
             self.validation_count = self.validations.all().count()
         return super().save(*args, **kwargs)
 
+    @staticmethod
+    def bulk_submit(user, texts):
+        """
+        Create or update the transcriptions of `user` given as {audio_id: text},
+        with the audio and image counters updated once for the batch.
+        Returns {audio_id: result}.
+        """
+        configuration = AppConfiguration.get_cached()
+        required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 2
+
+        results = {audio_id: "unavailable" for audio_id in texts}
+        texts = {audio_id: Transcription.normalize_text(text) for audio_id, text in texts.items()}
+        with transaction.atomic():
+            # Only transcriptions still waiting for review can be edited.
+            existing = list(Transcription.objects.filter(
+                audio_id__in=texts.keys(),
+                user=user,
+                transcription_status=TranscriptionStatus.PENDING.value,
+                audio__transcription_status=TranscriptionStatus.PENDING.value,
+                audio__deleted=False,
+            ).only("id", "audio_id", "text"))
+            for transcription in existing:
+                transcription.text = texts[transcription.audio_id]
+                transcription.text_fingerprint = Transcription.fingerprint_text(transcription.text)
+            Transcription.objects.bulk_update(existing, ["text", "text_fingerprint"])
+            updated_audio_ids = [transcription.audio_id for transcription in existing]
+
+            new_audio_ids = list(Audio.objects.filter(
+                id__in=texts.keys(),
+                deleted=False,
+                transcription_count__lt=required_transcription_validation_count,
+            ).exclude(transcriptions__user=user).values_list("id", flat=True))
+            # Bulk inserts bypass post_save, so the counters are updated here.
+            Transcription.objects.bulk_create([
+                Transcription(audio_id=audio_id,
+                              user=user,
+                              text=texts[audio_id],
+                              text_fingerprint=Transcription.fingerprint_text(texts[audio_id]))
+                for audio_id in new_audio_ids
+            ])
+            Audio.objects.filter(id__in=new_audio_ids).update(transcription_count=F("transcription_count") + 1)
+
+            audio_ids = updated_audio_ids + new_audio_ids
+            Audio.objects.filter(id__in=audio_ids).update(transcription_status=TranscriptionStatus.PENDING.value,
+                                                          updated_at=timezone.now())
+            Image.update_transcription_counts(new_audio_ids, 1)
+
+        for audio_id in updated_audio_ids:
+            results[audio_id] = "updated"
+        for audio_id in new_audio_ids:
+            results[audio_id] = "created"
+        return results
+
     # Deprecated
     def validate(self, user, status):
-        required_transcription_validation_count = AppConfiguration.objects.first(
+        required_transcription_validation_count = AppConfiguration.get_cached(
         ).required_transcription_validation_count
 
         validation = Validation.objects.filter(
@@ -487,24 +879,60 @@ class Transcription(models.Model):
 
 class AudioValidationAssignment(models.Model):
     user = models.ForeignKey(User, related_name="aligned_audios", on_delete=models.CASCADE)
-    audios = models.ManyToManyField(Audio, related_name="assignments", db_index=True)
+    audios = models.ManyToManyField(Audio, related_name="assignments", db_index=True,
+                                    through="AudioValidationAssignmentAudio")
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class AudioTranscriptionAssignment(models.Model):
     user = models.ForeignKey(User, related_name="assigned_transcription_audios", on_delete=models.CASCADE)
-    audios = models.ManyToManyField(Audio, related_name="transcriptions_assignments", db_index=True)
+    audios = models.ManyToManyField(Audio, related_name="transcriptions_assignments", db_index=True,
+                                    through="AudioTranscriptionAssignmentAudio")
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
 
 class TranscriptionResolutionAssignment(models.Model):
     user = models.ForeignKey(User, related_name="assinged_transcription_resolutions", on_delete=models.CASCADE)
-    audios = models.ManyToManyField(Audio, related_name="transcription_resolutions_assignments", db_index=True)
+    audios = models.ManyToManyField(Audio, related_name="transcription_resolutions_assignments", db_index=True,
+                                    through="TranscriptionResolutionAssignmentAudio")
     created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
+
+# Through tables of the assignments. Each audio carries the time it was
+# assigned so it can expire on its own instead of with the whole assignment.
+class AudioValidationAssignmentAudio(models.Model):
+    audiovalidationassignment = models.ForeignKey(AudioValidationAssignment, on_delete=models.CASCADE)
+    audio = models.ForeignKey(Audio, on_delete=models.CASCADE)
+    assigned_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "dashboard_audiovalidationassignment_audios"
+        unique_together = [("audiovalidationassignment", "audio")]
+
+
+class AudioTranscriptionAssignmentAudio(models.Model):
+    audiotranscriptionassignment = models.ForeignKey(AudioTranscriptionAssignment, on_delete=models.CASCADE)
+    audio = models.ForeignKey(Audio, on_delete=models.CASCADE)
+    assigned_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "dashboard_audiotranscriptionassignment_audios"
+        unique_together = [("audiotranscriptionassignment", "audio")]
+
+
+class TranscriptionResolutionAssignmentAudio(models.Model):
+    transcriptionresolutionassignment = models.ForeignKey(TranscriptionResolutionAssignment,
+                                                          on_delete=models.CASCADE)
+    audio = models.ForeignKey(Audio, on_delete=models.CASCADE)
+    assigned_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        db_table = "dashboard_transcriptionresolutionassignment_audios"
+        unique_together = [("transcriptionresolutionassignment", "audio")]
+
 class ExportTag(models.Model):
     user = models.ForeignKey(User, related_name="tags", on_delete=models.CASCADE,db_index=True)
     tag = models.CharField(max_length=50,db_index=True)
@@ -514,3 +942,65 @@ class ExportTag(models.Model):
 
     def __str__(self):
         return f"{self.tag} - {self.user}"
+
+
+class UploadSession(models.Model):
+    """An audio upload received in chunks, so interrupted uploads can resume."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(User, related_name="upload_sessions", on_delete=models.CASCADE)
+    file_name = models.CharField(max_length=255)
+    size = models.BigIntegerField()
+    offset = models.BigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    # Largest audio accepted through an upload session.
+    MAX_SIZE = 100 * 1024 * 1024
+
+    class Meta:
+        db_table = "upload_sessions"
+
+    def __str__(self):
+        return f"{self.file_name} - {self.offset}/{self.size}"
+
+    def get_temp_file_path(self):
+        return upload_ingest.get_temp_file_path(f"session_{self.id}")
+
+    def write_chunk(self, offset, data):
+        """
+        Write `data` at `offset`, which must be the current offset, and
+        return the new offset. Callers hold a lock on the session row.
+        """
+        path = self.get_temp_file_path()
+        with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+            f.seek(offset)
+            f.write(data)
+            f.truncate()
+        self.offset = offset + len(data)
+        UploadSession.objects.filter(id=self.id).update(offset=self.offset, updated_at=timezone.now())
+        return self.offset
+
+    def get_claimed_file_path(self):
+        return self.get_temp_file_path() + ".finalizing"
+
+    def claim_file(self):
+        """
+        Move the received file aside while the session is finalized and
+        return its new path, or None if it is not there. The rename is
+        atomic, so only one of overlapping finalizes gets the file.
+        """
+        try:
+            os.rename(self.get_temp_file_path(), self.get_claimed_file_path())
+        except FileNotFoundError:
+            return None
+        return self.get_claimed_file_path()
+
+    def release_file(self):
+        """Put back the file claimed by a failed finalize, so it can be retried."""
+        os.rename(self.get_claimed_file_path(), self.get_temp_file_path())
+
+    def discard(self):
+        for path in [self.get_temp_file_path(), self.get_claimed_file_path()]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.delete()
@@ -1,11 +1,28 @@
 import os
 
-from django.db import models
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models import F
 from django.dispatch import receiver
 
-from dashboard.models import Audio, Image, Transcription
+from dashboard import tasks
+from dashboard.models import (Audio, AudioTranscriptionAssignment,
+                              AudioValidationAssignment, Category, Image,
+                              Transcription, TranscriptionResolutionAssignment,
+                              Validation)
 from setup.models import AppConfiguration
 
+ASSIGNMENT_COUNTERS = {
+    AudioValidationAssignment: "validation_assignment_count",
+    AudioTranscriptionAssignment: "transcription_assignment_count",
+    TranscriptionResolutionAssignment: "resolution_assignment_count",
+}
+
+
+def update_audio_counter(counter, audio_ids, delta):
+    if audio_ids and delta:
+        Audio.objects.filter(id__in=audio_ids).update(**{counter: F(counter) + delta})
+
 
 @receiver(models.signals.post_delete, sender=Image)
 def auto_delete_image_file_on_delete(sender, instance, **kwargs):
@@ -21,6 +38,9 @@ def auto_delete_image_file_on_delete(sender, instance, **kwargs):
         if os.path.isfile(instance.thumbnail.path):
             os.remove(instance.thumbnail.path)
 
+    for file_name in instance.renditions.values():
+        default_storage.delete(file_name)
+
 
 @receiver(models.signals.post_delete, sender=Audio)
 def auto_delete_audio_file_on_delete(sender, instance, **kwargs):
@@ -33,184 +53,152 @@ def auto_delete_audio_file_on_delete(sender, instance, **kwargs):
             os.remove(instance.file.path)
 
 
-@receiver(models.signals.pre_save, sender=AppConfiguration)
-def auto_delete_conf_file_on_change(sender, instance, **kwargs):
+@receiver(models.signals.post_save, sender=AppConfiguration)
+@receiver(models.signals.post_save, sender=Image)
+@receiver(models.signals.post_save, sender=Audio)
+def delete_replaced_files(sender, instance, update_fields=None, **kwargs):
     """
-    Deletes old file from filesystem
-    when corresponding `AppConfiguration` object is updated
-    with new file.
+    Deletes files replaced by the save, once it is committed, outside of the
+    request.
     """
-    if not instance.pk:
-        return False
-    try:
-        old_android_apk = AppConfiguration.objects.get(
-            pk=instance.pk).android_apk
-
-        # Demo videos
-        old_demo_video_ewe = AppConfiguration.objects.get(
-            pk=instance.pk).demo_video_ewe
-
-        old_demo_video_akan = AppConfiguration.objects.get(
-            pk=instance.pk).demo_video_akan
-
-        old_demo_video_dagaare = AppConfiguration.objects.get(
-            pk=instance.pk).demo_video_dagaare
-
-        old_demo_video_ikposo = AppConfiguration.objects.get(
-            pk=instance.pk).demo_video_ikposo
-
-        old_demo_video_dagbani = AppConfiguration.objects.get(
-            pk=instance.pk).demo_video_dagbani
-
-        # Privacy statement audios
-        old_participant_privacy_statement_audio_ewe = AppConfiguration.objects.get(
-            pk=instance.pk).participant_privacy_statement_audio_ewe
-
-        old_participant_privacy_statement_audio_akan = AppConfiguration.objects.get(
-            pk=instance.pk).participant_privacy_statement_audio_akan
-
-        old_participant_privacy_statement_audio_dagaare = AppConfiguration.objects.get(
-            pk=instance.pk).participant_privacy_statement_audio_dagaare
-
-        old_participant_privacy_statement_audio_ikposo = AppConfiguration.objects.get(
-            pk=instance.pk).participant_privacy_statement_audio_ikposo
-
-        old_participant_privacy_statement_audio_dagbani = AppConfiguration.objects.get(
-            pk=instance.pk).participant_privacy_statement_audio_dagbani
-
-    except AppConfiguration.DoesNotExist:
-        return False
-
-    # Delete old videos
-    # Delete old ewe video
-    new_demo_video_ewe = instance.demo_video_ewe
-    if not old_demo_video_ewe == new_demo_video_ewe and old_demo_video_ewe:
-        if os.path.isfile(old_demo_video_ewe.path):
-            os.remove(old_demo_video_ewe.path)
-
-    # Delete old dagaare video
-    new_demo_video_dagaare = instance.demo_video_dagaare
-    if not old_demo_video_dagaare == new_demo_video_dagaare and old_demo_video_dagaare:
-        if os.path.isfile(old_demo_video_dagaare.path):
-            os.remove(old_demo_video_dagaare.path)
-
-    # Delete old dagbani video
-    new_demo_video_dagbani = instance.demo_video_dagbani
-    if not old_demo_video_dagbani == new_demo_video_dagbani and old_demo_video_dagbani:
-        if os.path.isfile(old_demo_video_dagbani.path):
-            os.remove(old_demo_video_dagbani.path)
-
-    # Delete old akan video
-    new_demo_video_akan = instance.demo_video_akan
-    if not old_demo_video_akan == new_demo_video_akan and old_demo_video_akan:
-        if os.path.isfile(old_demo_video_akan.path):
-            os.remove(old_demo_video_akan.path)
-
-    # Delete old ikposo video
-    new_demo_video_ikposo = instance.demo_video_ikposo
-    if not old_demo_video_ikposo == new_demo_video_ikposo and old_demo_video_ikposo:
-        if os.path.isfile(old_demo_video_ikposo.path):
-            os.remove(old_demo_video_ikposo.path)
-
-    # Android APK
-    new_android_apk = instance.android_apk
-    if not old_android_apk == new_android_apk and old_android_apk:
-        if os.path.isfile(old_android_apk.path):
-            os.remove(old_android_apk.path)
-
-    # Delete old ewe audio
-    new_participant_privacy_statement_audio_ewe = instance.participant_privacy_statement_audio_ewe
-    if not old_participant_privacy_statement_audio_ewe == new_participant_privacy_statement_audio_ewe and old_participant_privacy_statement_audio_ewe:
-        if os.path.isfile(old_participant_privacy_statement_audio_ewe.path):
-            os.remove(old_participant_privacy_statement_audio_ewe.path)
-
-    # Delete old dagaare audio
-    new_participant_privacy_statement_audio_dagaare = instance.participant_privacy_statement_audio_dagaare
-    if not old_participant_privacy_statement_audio_dagaare == new_participant_privacy_statement_audio_dagaare and old_participant_privacy_statement_audio_dagaare:
-        if os.path.isfile(
-                old_participant_privacy_statement_audio_dagaare.path):
-            os.remove(old_participant_privacy_statement_audio_dagaare.path)
-
-    # Delete old dagbani audio
-    new_participant_privacy_statement_audio_dagbani = instance.participant_privacy_statement_audio_dagbani
-    if not old_participant_privacy_statement_audio_dagbani == new_participant_privacy_statement_audio_dagbani and old_participant_privacy_statement_audio_dagbani:
-        if os.path.isfile(
-                old_participant_privacy_statement_audio_dagbani.path):
-            os.remove(old_participant_privacy_statement_audio_dagbani.path)
-
-    # Delete old akan audio
-    new_participant_privacy_statement_audio_akan = instance.participant_privacy_statement_audio_akan
-    if not old_participant_privacy_statement_audio_akan == new_participant_privacy_statement_audio_akan and old_participant_privacy_statement_audio_akan:
-        if os.path.isfile(old_participant_privacy_statement_audio_akan.path):
-            os.remove(old_participant_privacy_statement_audio_akan.path)
-
-    # Delete old ikposo audio
-    new_participant_privacy_statement_audio_ikposo = instance.participant_privacy_statement_audio_ikposo
-    if not old_participant_privacy_statement_audio_ikposo == new_participant_privacy_statement_audio_ikposo and old_participant_privacy_statement_audio_ikposo:
-        if os.path.isfile(old_participant_privacy_statement_audio_ikposo.path):
-            os.remove(old_participant_privacy_statement_audio_ikposo.path)
-
-
-@receiver(models.signals.pre_save, sender=Image)
-def auto_delete_image_file_on_change(sender, instance, **kwargs):
-    if not instance.pk:
-        return False
-    try:
-        old_file = Image.objects.get(pk=instance.pk).file
-        old_thumbnail = Image.objects.get(pk=instance.pk).thumbnail
-    except Image.DoesNotExist:
-        return False
-
-    # Delete old image file
-    new_file = instance.file
-    if old_file != new_file and old_file:
-        if os.path.isfile(old_file.path):
-            os.remove(old_file.path)
-
-    # Delete old thumbnail file
-    new_thumbnail = instance.thumbnail
-    if old_thumbnail != new_thumbnail and old_thumbnail:
-        if os.path.isfile(old_thumbnail.path):
-            os.remove(old_thumbnail.path)
-
-
-@receiver(models.signals.pre_save, sender=Audio)
-def auto_delete_audio_file_on_change(sender, instance, **kwargs):
-    if not instance.pk:
-        return False
-    old_file_wav = None
-    old_file_mp3 = None
-
-    try:
-        old_file_wav = Audio.objects.get(pk=instance.pk).file
-    except Audio.DoesNotExist:
-        pass
-
-    try:
-        old_file_mp3 = Audio.objects.get(pk=instance.pk).file_mp3
-    except Audio.DoesNotExist:
-        pass
-
-    # Delete old audio file
-    new_file_wav = instance.file
-    new_file_mp3 = instance.file_mp3
-
-    if old_file_mp3 != new_file_mp3 and old_file_mp3:
-        if os.path.isfile(old_file_mp3.path):
-            os.remove(old_file_mp3.path)
-
-    if old_file_wav != new_file_wav and old_file_wav:
-        if os.path.isfile(old_file_wav.path):
-            os.remove(old_file_wav.path)
+    replaced_files = instance.pop_replaced_files(update_fields)
+    if replaced_files:
+        transaction.on_commit(lambda: tasks.delete_replaced_files.delay(replaced_files))
 
 
 @receiver(models.signals.post_save, sender=Transcription)
-def recount_transcriptions_per_image(sender, instance, **kwargs):
-    image = instance.audio.image
-    audio = instance.audio
-    transcription_count = Transcription.objects.filter(
-                audio__locale=audio.locale, deleted=False,
-                audio__image=image).count()
-    setattr(image, f"transcription_count_{audio.locale}",
-                    transcription_count)
-    image.save()
\ No newline at end of file
+def update_image_transcription_counter(sender, instance, created, update_fields=None, **kwargs):
+    """
+    Count transcriptions on their image when created or restored, and
+    uncount them when soft deleted. Text edits leave the counters alone.
+    """
+    if created:
+        delta = 0 if instance.deleted else 1
+    elif update_fields is not None and "deleted" not in update_fields:
+        return
+    else:
+        original_deleted = getattr(instance, "_original_deleted", None)
+        if original_deleted is None or original_deleted == instance.deleted:
+            delta = 0
+        else:
+            delta = -1 if instance.deleted else 1
+    instance._original_deleted = instance.deleted
+    if delta:
+        Image.update_transcription_counts([instance.audio_id], delta)
+
+
+@receiver(models.signals.post_delete, sender=Transcription)
+def decrement_image_transcription_counter(sender, instance, **kwargs):
+    if not instance.deleted:
+        Image.update_transcription_counts([instance.audio_id], -1)
+
+
+@receiver(models.signals.m2m_changed, sender=AudioValidationAssignment.audios.through)
+@receiver(models.signals.m2m_changed, sender=AudioTranscriptionAssignment.audios.through)
+@receiver(models.signals.m2m_changed, sender=TranscriptionResolutionAssignment.audios.through)
+def update_assignment_counters(sender, instance, action, reverse, model, pk_set, **kwargs):
+    """
+    Keep the assignment counters on `Audio` in step with the assignment lists.
+    """
+    assignment_model = model if reverse else type(instance)
+    counter = ASSIGNMENT_COUNTERS[assignment_model]
+
+    if action == "pre_clear":
+        if reverse:
+            instance._cleared_count = sender.objects.filter(audio=instance).count()
+        else:
+            instance._cleared_audio_ids = list(instance.audios.values_list("id", flat=True))
+        return
+
+    if action in ["post_add", "post_remove"]:
+        delta = 1 if action == "post_add" else -1
+        if reverse:
+            update_audio_counter(counter, [instance.pk], delta * len(pk_set))
+        else:
+            update_audio_counter(counter, pk_set, delta)
+    elif action == "post_clear":
+        if reverse:
+            update_audio_counter(counter, [instance.pk], -getattr(instance, "_cleared_count", 0))
+        else:
+            update_audio_counter(counter, getattr(instance, "_cleared_audio_ids", []), -1)
+
+
+@receiver(models.signals.pre_delete, sender=AudioValidationAssignment)
+@receiver(models.signals.pre_delete, sender=AudioTranscriptionAssignment)
+@receiver(models.signals.pre_delete, sender=TranscriptionResolutionAssignment)
+def release_assignment_counters(sender, instance, **kwargs):
+    """
+    Deleting an assignment removes its rows from the through table without
+    sending `m2m_changed`.
+    """
+    counter = ASSIGNMENT_COUNTERS[sender]
+    instance.audios.update(**{counter: F(counter) - 1})
+
+
+@receiver(models.signals.m2m_changed, sender=Audio.validations.through)
+def update_validation_counter(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ["post_add", "post_remove"]:
+        return
+    delta = 1 if action == "post_add" else -1
+    if reverse:
+        if not instance.archived:
+            update_audio_counter("validation_count", pk_set, delta)
+    else:
+        active = Validation.objects.filter(id__in=pk_set, archived=False).count()
+        update_audio_counter("validation_count", [instance.pk], delta * active)
+
+
+@receiver(models.signals.m2m_changed, sender=Image.validations.through)
+def update_image_valid_validation_counter(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep `valid_validation_count` in step when validations are added to or
+    removed from images outside of `Image.validate`, which writes the
+    through rows and the counter itself.
+    """
+    if action == "pre_clear":
+        if reverse:
+            instance._cleared_image_ids = list(instance.image_validations.values_list("id", flat=True))
+        else:
+            instance._cleared_valid_count = instance.validations.filter(is_valid=True).count()
+        return
+
+    if action in ["post_add", "post_remove"]:
+        delta = 1 if action == "post_add" else -1
+        if reverse:
+            image_ids, change = (pk_set, delta) if instance.is_valid else ([], 0)
+        else:
+            image_ids = [instance.pk]
+            change = delta * Validation.objects.filter(id__in=pk_set, is_valid=True).count()
+    elif action == "post_clear":
+        if reverse:
+            image_ids, change = (getattr(instance, "_cleared_image_ids", []), -1) if instance.is_valid else ([], 0)
+        else:
+            image_ids, change = [instance.pk], -getattr(instance, "_cleared_valid_count", 0)
+    else:
+        return
+    if image_ids and change:
+        Image.objects.filter(id__in=image_ids).update(valid_validation_count=F("valid_validation_count") + change)
+
+
+@receiver(models.signals.post_save, sender=Transcription)
+def increment_transcription_counter(sender, instance, created, **kwargs):
+    if created:
+        update_audio_counter("transcription_count", [instance.audio_id], 1)
+
+
+@receiver(models.signals.post_delete, sender=Transcription)
+def decrement_transcription_counter(sender, instance, **kwargs):
+    update_audio_counter("transcription_count", [instance.audio_id], -1)
+
+
+@receiver(models.signals.post_save, sender=Category)
+@receiver(models.signals.post_delete, sender=Category)
+def invalidate_cached_categories(sender, **kwargs):
+    transaction.on_commit(Category.invalidate_cache)
+
+
+@receiver(models.signals.post_save, sender=AppConfiguration)
+@receiver(models.signals.post_delete, sender=AppConfiguration)
+@receiver(models.signals.m2m_changed, sender=AppConfiguration.limited_groups.through)
+def invalidate_cached_configuration(sender, **kwargs):
+    transaction.on_commit(AppConfiguration.invalidate_cache)
@@ -0,0 +1,31 @@
+import logging
+
+from datetime import timedelta
+
+from celery import shared_task
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from dashboard.models import UploadSession
+
+logger = logging.getLogger("app")
+
+
+@shared_task()
+def delete_replaced_files(file_names):
+    for file_name in file_names:
+        try:
+            default_storage.delete(file_name)
+        except OSError as e:
+            logger.error(f"Could not delete replaced file {file_name}: {e}")
+
+
+@shared_task()
+def delete_expired_upload_sessions(hours=24):
+    """Discard upload sessions that received no chunk for `hours`."""
+    sessions = UploadSession.objects.filter(updated_at__lte=timezone.now() - timedelta(hours=hours))
+    count = 0
+    for session in sessions:
+        session.discard()
+        count += 1
+    return f"Discarded {count} upload sessions"
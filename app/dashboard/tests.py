@@ -1,3 +1,117 @@
+from datetime import timedelta
+from unittest import mock
+
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import User
+from dashboard.assignments import expire_assigned_audios
+from dashboard.models import (Audio, AudioValidationAssignment, Image,
+                              Validation)
+from local_voice.utils import validation_queue
+from local_voice.utils.constants import ValidationStatus
+from setup import models as setup_models
+from setup.models import AppConfiguration
+
+
+class AudioValidationQueriesTest(TestCase):
+    """Lock in the number of queries used to record audio validations."""
+
+    def setUp(self):
+        for module in [validation_queue, setup_models]:
+            patcher = mock.patch.object(module, "redis_client", mock.MagicMock())
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        # AppConfiguration.save only writes once an APK is uploaded.
+        AppConfiguration.objects.bulk_create(
+            [AppConfiguration(required_audio_validation_count=2)])
+        # Load the configuration into the per-process cache.
+        AppConfiguration.invalidate_cache()
+        AppConfiguration.get_cached()
+
+        submitter = User.objects.create(email_address="submitter@example.com")
+        image = Image.objects.create(name="image")
+        self.audios = [
+            Audio.objects.create(file="audio.wav",
+                                 image=image,
+                                 locale="ak_gh",
+                                 submitted_by=submitter) for _ in range(5)
+        ]
+        self.validators = [
+            User.objects.create(email_address=f"validator{i}@example.com")
+            for i in range(2)
+        ]
+
+    def test_first_validation(self):
+        audio = self.audios[0]
+        with self.assertNumQueries(9):
+            audio.validate(self.validators[0], ValidationStatus.ACCEPTED.value)
+
+        audio.refresh_from_db()
+        self.assertEqual(audio.validation_count, 1)
+        self.assertEqual(audio.second_audio_status, ValidationStatus.PENDING.value)
+
+    def test_deciding_validation(self):
+        audio = self.audios[0]
+        audio.validate(self.validators[0], ValidationStatus.REJECTED.value)
+        with self.assertNumQueries(9):
+            audio.validate(self.validators[1], ValidationStatus.REJECTED.value)
+
+        audio.refresh_from_db()
+        self.assertEqual(audio.validation_count, 2)
+        self.assertEqual(audio.second_audio_status, ValidationStatus.REJECTED.value)
+
+    def test_changed_validation(self):
+        audio = self.audios[0]
+        audio.validate(self.validators[0], ValidationStatus.REJECTED.value)
+        audio.validate(self.validators[1], ValidationStatus.ACCEPTED.value)
+        with self.assertNumQueries(7):
+            audio.validate(self.validators[0], ValidationStatus.ACCEPTED.value)
+
+        audio.refresh_from_db()
+        self.assertEqual(audio.validation_count, 2)
+        self.assertEqual(audio.second_audio_status, ValidationStatus.ACCEPTED.value)
+
+    def test_bulk_validation(self):
+        statuses = {
+            audio.id: ValidationStatus.ACCEPTED.value
+            for audio in self.audios
+        }
+        with self.assertNumQueries(10):
+            results = Audio.bulk_validate(self.validators[0], statuses)
+
+        self.assertEqual(set(results.values()), {"recorded"})
+        self.assertEqual(
+            set(Audio.objects.values_list("validation_count", flat=True)), {1})
+
+
+class AssignmentExpiryTest(TestCase):
+    """Only audios the assigned user has not worked on expire."""
+
+    def setUp(self):
+        submitter = User.objects.create(email_address="submitter@example.com")
+        self.validator = User.objects.create(email_address="validator@example.com")
+        image = Image.objects.create(name="image")
+        self.audios = [
+            Audio.objects.create(file="audio.wav",
+                                 image=image,
+                                 locale="ak_gh",
+                                 submitted_by=submitter) for _ in range(2)
+        ]
+        self.assignment = AudioValidationAssignment.objects.create(user=self.validator)
+        self.assignment.audios.set(self.audios)
+        AudioValidationAssignment.audios.through.objects.update(
+            assigned_at=timezone.now() - timedelta(hours=7))
+
+    def test_worked_on_audio_survives_expiry(self):
+        worked_on, untouched = self.audios
+        worked_on.validations.add(
+            Validation.objects.create(user=self.validator, is_valid=True))
+
+        released = expire_assigned_audios(AudioValidationAssignment, 6)
 
-# Create your tests here.
+        self.assertEqual(released, [untouched.id])
+        self.assertEqual(list(self.assignment.audios.all()), [worked_on])
+        untouched.refresh_from_db()
+        self.assertEqual(untouched.validation_assignment_count, 0)
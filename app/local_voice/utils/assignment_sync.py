@@ -0,0 +1,58 @@
+"""Snapshots of the audios assigned to users, for delta sync on the mobile app.
+
+Each bulk assignment response stores the list of audio ids it returned under a
+new sync token, replacing the previous snapshot of the user for that list. When
+the app sends the latest token back, the server only returns the audios added
+since the snapshot and the ids that were removed. Older, unknown or expired
+tokens, and Redis failures, fall back to a full sync.
+"""
+import logging
+import uuid
+
+import redis
+from django.conf import settings
+from redis.exceptions import RedisError
+
+logger = logging.getLogger("app")
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+SNAPSHOT_KEY_PREFIX = "assignment_sync"
+# The app syncs about every 30 minutes; older tokens fall back to a full sync.
+SNAPSHOT_TIMEOUT = 3 * 24 * 60 * 60
+
+
+def snapshot_key(name, user):
+    return f"{SNAPSHOT_KEY_PREFIX}:{name}:{user.id}"
+
+
+def load_snapshot(name, user, token):
+    """Return the set of audio ids stored under the token, or None if unknown."""
+    if not token:
+        return None
+    try:
+        value = redis_client.get(snapshot_key(name, user))
+    except RedisError as e:
+        logger.error(f"Assignment snapshot lookup failed: {e}")
+        return None
+    if value is None:
+        return None
+    stored_token, _, audio_ids = value.decode().partition(":")
+    if stored_token != token:
+        return None
+    return {int(audio_id) for audio_id in audio_ids.split(",") if audio_id}
+
+
+def save_snapshot(name, user, audio_ids):
+    """
+    Store the audio ids under a new token, replacing the previous snapshot,
+    and return the token, or None on failure.
+    """
+    token = uuid.uuid4().hex
+    value = token + ":" + ",".join(str(audio_id) for audio_id in audio_ids)
+    try:
+        redis_client.set(snapshot_key(name, user), value, ex=SNAPSHOT_TIMEOUT)
+    except RedisError as e:
+        logger.error(f"Assignment snapshot save failed: {e}")
+        return None
+    return token
@@ -0,0 +1,162 @@
+"""Acoustic quality metrics of uploaded audios.
+
+Each upload is decoded once into mono samples scaled to [-1, 1], and the
+metrics are computed over 50 ms frames with NumPy. Levels are in dBFS, where
+0 is digital full scale. Clips failing hard limits are rejected on ingest;
+borderline ones are validated after the others.
+"""
+import logging
+import subprocess
+import wave
+
+import ffmpeg
+import numpy as np
+from mutagen import File as MFile
+
+from local_voice.utils.constants import ValidationStatus
+
+logger = logging.getLogger("app")
+
+FRAME_SECONDS = 0.05
+# Levels reported for digital silence.
+MIN_LEVEL = -100.0
+# Frames quieter than this count as silence.
+SILENCE_LEVEL = -50.0
+# Samples at or above this fraction of full scale count as clipped.
+CLIPPING_LEVEL = 0.999
+# Sample rate used when decoding compressed formats with ffmpeg.
+DECODE_SAMPLE_RATE = 16000
+DECODE_TIMEOUT = 60
+
+# Same minimum and rounding as the header check on upload.
+MIN_DURATION = 15
+# Decoded audio this much shorter than its header says is truncated.
+TRUNCATION_TOLERANCE = 1.0
+TRUNCATION_TOLERANCE_RATIO = 0.05
+MIN_RMS_LEVEL = -60.0
+MAX_SILENCE_RATIO = 0.9
+MAX_CLIPPING_RATIO = 0.01
+FLAG_CLIPPING_RATIO = 0.001
+FLAG_SILENCE_RATIO = 0.6
+
+QUALITY_FIELDS = ["rms_level", "noise_floor", "clipping_ratio", "silence_ratio", "true_duration"]
+
+
+def decode_wav(path):
+    with wave.open(path, "rb") as f:
+        sample_width = f.getsampwidth()
+        channels = f.getnchannels()
+        sample_rate = f.getframerate()
+        data = f.readframes(f.getnframes())
+
+    if sample_width == 1:
+        samples = (np.frombuffer(data, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif sample_width == 2:
+        samples = np.frombuffer(data, dtype="<i2").astype(np.float32) / 2**15
+    elif sample_width == 3:
+        raw = np.frombuffer(data, dtype=np.uint8).reshape(-1, 3)
+        ints = (raw[:, 0].astype(np.int32) | raw[:, 1].astype(np.int32) << 8 | raw[:, 2].astype(np.int32) << 16)
+        samples = np.where(ints >= 2**23, ints - 2**24, ints).astype(np.float32) / 2**23
+    elif sample_width == 4:
+        samples = np.frombuffer(data, dtype="<i4").astype(np.float32) / 2**31
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    return samples.reshape(-1, channels).mean(axis=1), sample_rate
+
+
+def decode_with_ffmpeg(path):
+    args = ffmpeg.compile(ffmpeg.output(ffmpeg.input(path), "pipe:", format="s16le", ac=1, ar=DECODE_SAMPLE_RATE))
+    result = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+                            timeout=DECODE_TIMEOUT)
+    return np.frombuffer(result.stdout, dtype="<i2").astype(np.float32) / 2**15, DECODE_SAMPLE_RATE
+
+
+def decode(path):
+    """Return the samples of the audio at `path`, mixed to mono, and the sample rate."""
+    try:
+        return decode_wav(path)
+    except (wave.Error, EOFError, ValueError):
+        return decode_with_ffmpeg(path)
+
+
+def to_level(rms):
+    return np.maximum(20 * np.log10(np.maximum(rms, 1e-10)), MIN_LEVEL)
+
+
+def compute_metrics(samples, sample_rate):
+    """Return the quality metrics of mono samples in [-1, 1]."""
+    true_duration = len(samples) / sample_rate if sample_rate else 0.0
+    if not len(samples):
+        return {"rms_level": MIN_LEVEL, "noise_floor": MIN_LEVEL, "clipping_ratio": 0.0,
+                "silence_ratio": 1.0, "true_duration": true_duration}
+
+    frame_length = max(int(sample_rate * FRAME_SECONDS), 1)
+    frame_count = max(len(samples) // frame_length, 1)
+    frames = samples[:frame_count * frame_length].reshape(frame_count, -1)
+    frame_levels = to_level(np.sqrt(np.mean(np.square(frames), axis=1)))
+
+    return {
+        "rms_level": float(to_level(np.sqrt(np.mean(np.square(samples))))),
+        # The quietest frames are taken as the background noise.
+        "noise_floor": float(np.percentile(frame_levels, 10)),
+        "clipping_ratio": float(np.mean(np.abs(samples) >= CLIPPING_LEVEL)),
+        "silence_ratio": float(np.mean(frame_levels < SILENCE_LEVEL)),
+        "true_duration": float(true_duration),
+    }
+
+
+def get_header_duration(path):
+    header = MFile(path)
+    return header.info.length if header is not None else None
+
+
+def measure(path):
+    """
+    Return the quality metrics of the audio at `path`, with the duration its
+    header gives as "header_duration", or None if it cannot be decoded.
+    """
+    try:
+        metrics = compute_metrics(*decode(path))
+        metrics["header_duration"] = get_header_duration(path)
+        return metrics
+    except (OSError, ValueError, subprocess.SubprocessError) as e:
+        logger.error(f"Could not measure the quality of {path}: {e}")
+        return None
+
+
+def assess(metrics, max_background_noise_level=100):
+    """
+    Return ("rejected" | "flagged" | "ok", reason). The configured maximum
+    background noise level is on a 0-100 scale, 100 being full scale and
+    0 being -100 dBFS, so the default of 100 rejects nothing on noise.
+    """
+    header_duration = metrics.get("header_duration")
+    if header_duration and header_duration - metrics["true_duration"] > max(
+            TRUNCATION_TOLERANCE, header_duration * TRUNCATION_TOLERANCE_RATIO):
+        return "rejected", f"TRUNCATED: {metrics['true_duration']:.1f}s of {header_duration:.1f}s"
+    if round(metrics["true_duration"]) < MIN_DURATION:
+        return "rejected", f"TOO_SHORT: {metrics['true_duration']:.1f}s"
+    if metrics["rms_level"] < MIN_RMS_LEVEL:
+        return "rejected", f"TOO_QUIET: {metrics['rms_level']:.1f} dBFS"
+    if metrics["silence_ratio"] > MAX_SILENCE_RATIO:
+        return "rejected", f"MOSTLY_SILENT: {metrics['silence_ratio']:.0%}"
+    if metrics["clipping_ratio"] > MAX_CLIPPING_RATIO:
+        return "rejected", f"CLIPPED: {metrics['clipping_ratio']:.2%}"
+    if metrics["noise_floor"] - MIN_LEVEL > max_background_noise_level:
+        return "rejected", f"NOISY: {metrics['noise_floor']:.1f} dBFS"
+    if metrics["clipping_ratio"] > FLAG_CLIPPING_RATIO or metrics["silence_ratio"] > FLAG_SILENCE_RATIO:
+        return "flagged", "BORDERLINE_QUALITY"
+    return "ok", ""
+
+
+def get_audio_fields(metrics, max_background_noise_level=100):
+    """Return the Audio field values for the metrics and their assessment."""
+    if metrics is None:
+        return {}
+    fields = {name: metrics[name] for name in QUALITY_FIELDS}
+    result, reason = assess(metrics, max_background_noise_level)
+    if result == "rejected":
+        fields.update(second_audio_status=ValidationStatus.REJECTED.value, note=f"AUTO_REJECTED: {reason}"[:200])
+    elif result == "flagged":
+        fields["quality_flagged"] = True
+    return fields
@@ -43,3 +43,10 @@ class TranscriptionStatus(Enum):
     PENDING = "pending"
     CONFLICT = "conflict"
     IN_REVIEW = "in_review"
+
+
+class LeaseDuration(Enum):
+    # In minutes
+    VALIDATION = 5
+    TRANSCRIPTION = 20
+    RESOLUTION = 20
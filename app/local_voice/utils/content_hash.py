@@ -0,0 +1,25 @@
+"""Content hashes of uploaded files, used to recognise duplicate uploads."""
+import hashlib
+
+
+def hash_chunks(chunks):
+    """Return the SHA-256 hex digest of an iterable of byte chunks."""
+    hasher = hashlib.sha256()
+    for chunk in chunks:
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def hash_file(file):
+    """Return the SHA-256 hex digest of a Django `File`, read in chunks."""
+    file.open("rb")
+    try:
+        return hash_chunks(file.chunks())
+    finally:
+        file.close()
+
+
+def hash_path(path, chunk_size=64 * 1024):
+    """Return the SHA-256 hex digest of the file at `path`, read in chunks."""
+    with open(path, "rb") as f:
+        return hash_chunks(iter(lambda: f.read(chunk_size), b""))
@@ -0,0 +1,87 @@
+"""Concurrent fetching of crawled images.
+
+All fetches share one pooled `requests.Session`, so connections to the same
+host are reused. Urls wait in a queue per host, and the dispatcher only hands
+a url to the pool while its host has fewer requests in flight than the limit,
+so no worker sits blocked on a busy host while other hosts wait. Every request
+has connect and read timeouts and a size cap.
+"""
+import logging
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("app")
+
+MAX_WORKERS = 16
+MAX_REQUESTS_PER_HOST = 4
+# (connect, read) timeouts in seconds.
+FETCH_TIMEOUT = (5, 30)
+MAX_IMAGE_BYTES = 20 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+def create_session(pool_size=MAX_WORKERS):
+    session = requests.Session()
+    retries = Retry(total=2, backoff_factor=0.5, status_forcelist=[502, 503, 504], allowed_methods=["GET"])
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retries)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_host(url):
+    return urlsplit(url).netloc.lower()
+
+
+def fetch(session, url, timeout=FETCH_TIMEOUT):
+    """Return the content at `url`, or None if it cannot be fetched."""
+    try:
+        with session.get(url, timeout=timeout, stream=True) as response:
+            if response.status_code != requests.codes.ok:
+                logger.info(f"Could not fetch {url}: HTTP {response.status_code}")
+                return None
+            content = bytearray()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                content.extend(chunk)
+                if len(content) > MAX_IMAGE_BYTES:
+                    logger.info(f"Could not fetch {url}: larger than {MAX_IMAGE_BYTES} bytes")
+                    return None
+            return bytes(content)
+    except (requests.RequestException, ValueError) as e:
+        logger.info(f"Could not fetch {url}: {e}")
+        return None
+
+
+def fetch_all(session, urls, max_workers=MAX_WORKERS, max_requests_per_host=MAX_REQUESTS_PER_HOST,
+              timeout=FETCH_TIMEOUT):
+    """
+    Fetch `urls` concurrently with `session` and yield (url, content or None)
+    as each completes. No more fetches than workers are pending at a time,
+    which bounds the content waiting to be consumed.
+    """
+    queues = {}
+    for url in urls:
+        queues.setdefault(get_host(url), deque()).append(url)
+    in_flight = Counter()
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while queues or pending:
+            for host in list(queues):
+                queue = queues[host]
+                while queue and len(pending) < max_workers and in_flight[host] < max_requests_per_host:
+                    url = queue.popleft()
+                    pending[executor.submit(fetch, session, url, timeout)] = (url, host)
+                    in_flight[host] += 1
+                if not queue:
+                    del queues[host]
+
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, host = pending.pop(future)
+                in_flight[host] -= 1
+                yield url, future.result()
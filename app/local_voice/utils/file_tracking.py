@@ -0,0 +1,52 @@
+"""Tracking of replaced files on model instances.
+
+Models using `FileTrackingMixin` remember the names of their file fields as
+loaded from the database. After a save, the names that changed are the files
+that were replaced, found without reading the old row again.
+"""
+
+
+class FileTrackingMixin:
+    # Names of the file fields to track.
+    tracked_file_fields = []
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._original_file_names = {
+            name: value or ""
+            for name, value in zip(field_names, values)
+            if name in cls.tracked_file_fields
+        }
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self.reset_tracked_files(fields)
+
+    def get_file_name(self, field_name):
+        return getattr(self, field_name).name or ""
+
+    def reset_tracked_files(self, fields=None):
+        if not hasattr(self, "_original_file_names"):
+            self._original_file_names = {}
+        deferred_fields = self.get_deferred_fields()
+        for name in self.tracked_file_fields:
+            if (fields is None or name in fields) and name not in deferred_fields:
+                self._original_file_names[name] = self.get_file_name(name)
+
+    def pop_replaced_files(self, update_fields=None):
+        """
+        Return the original names of tracked files changed since they were
+        loaded, and track the current names from now on. Only fields in
+        `update_fields` are considered when given, as others were not saved.
+        """
+        original_file_names = getattr(self, "_original_file_names", {})
+        replaced = []
+        for name, original in original_file_names.items():
+            if update_fields is not None and name not in update_fields:
+                continue
+            if original and original != self.get_file_name(name):
+                replaced.append(original)
+        self.reset_tracked_files(update_fields)
+        return replaced
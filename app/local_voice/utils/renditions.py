@@ -0,0 +1,65 @@
+"""Downscaled renditions of images, made with a single decode.
+
+The source is opened once; JPEG sources are decoded straight at a reduced
+scale with `draft()`, close to the largest rendition instead of at full
+resolution. Every rendition is then resized from the next larger one and
+encoded in each of the rendition formats.
+"""
+from io import BytesIO
+
+from PIL import Image as PillowImage
+from PIL import features
+
+# Longest side of each rendition, in pixels.
+RENDITION_SIZES = [200, 600]
+# Extension: (Pillow format, encoder options).
+RENDITION_FORMATS = {
+    "jpg": ("JPEG", {"quality": 80, "optimize": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+}
+# The smallest JPEG rendition is kept in `Image.thumbnail`.
+THUMBNAIL_RENDITION = "200.jpg"
+
+
+def get_rendition_key(size, extension):
+    return f"{size}.{extension}"
+
+
+def get_formats():
+    """Return the rendition formats the installed Pillow can encode."""
+    return {
+        extension: (image_format, options)
+        for extension, (image_format, options) in RENDITION_FORMATS.items()
+        if image_format != "WEBP" or features.check("webp")
+    }
+
+
+def open_image(source):
+    """
+    Open the image in `source`, a path or a file object, without decoding it.
+    Returns the image and its size at full resolution.
+    """
+    image = PillowImage.open(source)
+    size = image.size
+    if image.format == "JPEG":
+        largest = max(RENDITION_SIZES)
+        # Keeps at least the requested size, in steps of 1/2, 1/4 and 1/8.
+        image.draft("RGB", (largest, largest))
+    return image, size
+
+
+def make_renditions(image):
+    """
+    Return {rendition key: encoded bytes} for the image opened with
+    `open_image`, decoding it once.
+    """
+    current = image.convert("RGB")
+    formats = get_formats()
+    renditions = {}
+    for size in sorted(RENDITION_SIZES, reverse=True):
+        current.thumbnail((size, size), PillowImage.ANTIALIAS)
+        for extension, (image_format, options) in formats.items():
+            output = BytesIO()
+            current.save(output, image_format, **options)
+            renditions[get_rendition_key(size, extension)] = output.getvalue()
+    return renditions
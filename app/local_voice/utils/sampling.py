@@ -0,0 +1,49 @@
+"""Random selection backed by an indexed `random_key` column.
+
+Models using this store a uniform random float per row. Sampling picks a random
+pivot and takes the rows following it in key order, wrapping around to the
+start of the key space when the tail is too short, so only index range seeks
+are needed instead of sorting the whole set with ORDER BY RANDOM().
+"""
+import random
+
+from django.db.models import Case, IntegerField, Q, Value, When
+
+
+def new_random_key():
+    return random.random()
+
+
+def random_sample(queryset, count, pivot=None):
+    """
+    Narrow `queryset` to `count` random rows, ordered by random key.
+    Returns every row ordered by random key when `count` is not positive.
+    """
+    ordered = queryset.order_by("random_key")
+    if not count or count <= 0:
+        return ordered
+
+    pivot = random.random() if pivot is None else pivot
+    tail = ordered.filter(random_key__gte=pivot)
+    last_key = tail.values_list("random_key", flat=True)[count - 1:count].first()
+    if last_key is not None:
+        return ordered.filter(random_key__gte=pivot, random_key__lte=last_key)
+
+    # The tail is too short, wrap around to the start of the key space.
+    remaining = count - tail.count()
+    head = ordered.filter(random_key__lt=pivot)
+    last_key = head.values_list("random_key", flat=True)[remaining - 1:remaining].first()
+    if last_key is None:
+        return ordered
+    return ordered.filter(Q(random_key__gte=pivot) | Q(random_key__lte=last_key))
+
+
+def random_order(queryset, pivot=None):
+    """
+    Order every row of `queryset` by random key, starting at a random pivot
+    and wrapping around, so each call starts from a different row.
+    """
+    pivot = random.random() if pivot is None else pivot
+    return queryset.order_by(
+        Case(When(random_key__gte=pivot, then=Value(0)), default=Value(1), output_field=IntegerField()),
+        "random_key")
@@ -0,0 +1,74 @@
+"""Parallel transcoding of audio files with ffmpeg.
+
+ffmpeg does the work in its own processes, so a bounded pool of threads, each
+waiting on one ffmpeg process at a time, keeps every core busy without forking
+the Celery worker. Every file gets a timeout, and long runs store the last id
+they finished in Redis so a restarted run resumes from there.
+"""
+import logging
+import os
+import subprocess
+
+import ffmpeg
+import redis
+from django.conf import settings
+from redis.exceptions import RedisError
+
+logger = logging.getLogger("app")
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+CHECKPOINT_KEY_PREFIX = "transcoder_checkpoint"
+# Seconds allowed to convert a single file.
+TRANSCODE_TIMEOUT = 5 * 60
+
+
+def get_pool_size():
+    return os.cpu_count() or 1
+
+
+def transcode(input_file, output_file, timeout=TRANSCODE_TIMEOUT):
+    """Convert `input_file` into `output_file`. Returns whether it succeeded."""
+    args = ffmpeg.compile(ffmpeg.output(ffmpeg.input(input_file), output_file), overwrite_output=True)
+    try:
+        subprocess.run(args, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        logger.error(f"Transcoding {input_file} timed out after {timeout}s")
+    except subprocess.CalledProcessError as e:
+        logger.error(f"Transcoding {input_file} failed: {e.stderr.decode(errors='replace')[-500:]}")
+    except OSError as e:
+        logger.error(f"Transcoding {input_file} failed: {e}")
+    else:
+        return True
+
+    if os.path.isfile(output_file):
+        os.remove(output_file)
+    return False
+
+
+def checkpoint_key(name):
+    return f"{CHECKPOINT_KEY_PREFIX}:{name}"
+
+
+def load_checkpoint(name):
+    """Return the last id finished by the run called `name`, or 0."""
+    try:
+        value = redis_client.get(checkpoint_key(name))
+    except RedisError as e:
+        logger.error(f"Transcoder checkpoint lookup failed: {e}")
+        return 0
+    return int(value) if value else 0
+
+
+def save_checkpoint(name, last_id):
+    try:
+        redis_client.set(checkpoint_key(name), last_id)
+    except RedisError as e:
+        logger.error(f"Transcoder checkpoint save failed: {e}")
+
+
+def clear_checkpoint(name):
+    try:
+        redis_client.delete(checkpoint_key(name))
+    except RedisError as e:
+        logger.error(f"Transcoder checkpoint reset failed: {e}")
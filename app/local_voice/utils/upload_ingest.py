@@ -0,0 +1,71 @@
+"""Single-copy ingestion of uploaded files into the media storage.
+
+Uploads are streamed in chunks to a temporary file inside MEDIA_ROOT, hashed on
+the way, analysed there and finally renamed into their storage location, so a
+file is written to disk once and never held fully in memory.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+UPLOAD_TEMP_DIR = "tmp"
+
+
+def get_temp_dir():
+    temp_dir = os.path.join(settings.MEDIA_ROOT, UPLOAD_TEMP_DIR)
+    os.makedirs(temp_dir, exist_ok=True)
+    return temp_dir
+
+
+def get_temp_file_path(name):
+    """Path of a named temporary file under MEDIA_ROOT, e.g. a resumable upload."""
+    return os.path.join(get_temp_dir(), name)
+
+
+def create_temp_file(suffix=""):
+    """Create an empty temporary file under MEDIA_ROOT and return its path."""
+    fd, temp_file_path = tempfile.mkstemp(suffix=suffix, dir=get_temp_dir())
+    os.close(fd)
+    return temp_file_path
+
+
+def stream_to_temp_file(uploaded_file):
+    """
+    Write the upload to a temporary file under MEDIA_ROOT. Returns the path of
+    the file and the SHA-256 of its content.
+    """
+    fd, temp_file_path = tempfile.mkstemp(dir=get_temp_dir())
+    hasher = hashlib.sha256()
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in uploaded_file.chunks():
+                f.write(chunk)
+                hasher.update(chunk)
+    except BaseException:
+        os.remove(temp_file_path)
+        raise
+    return temp_file_path, hasher.hexdigest()
+
+
+def move_into_storage(temp_file_path, name):
+    """
+    Move a temporary file from `stream_to_temp_file` to an available storage
+    name based on `name`, with a rename instead of a copy. Returns the name.
+    """
+    while True:
+        name = default_storage.get_available_name(name)
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            # Unlike a rename, linking fails when a concurrent upload took the name.
+            os.link(temp_file_path, path)
+        except FileExistsError:
+            continue
+        break
+    os.remove(temp_file_path)
+    if settings.FILE_UPLOAD_PERMISSIONS is not None:
+        os.chmod(path, settings.FILE_UPLOAD_PERMISSIONS)
+    return name
@@ -0,0 +1,205 @@
+"""Per-locale queue of audios that still need validations.
+
+Every locale has a sorted set in Redis holding the ids of pending audios with
+free validation slots. Like the database fallback, validations and assignments
+are each checked against the required count on their own, since assignees
+stay assigned after validating. Scores order the queue by remaining slots
+first and audio id second, so audios closest to a decision are handed out
+first. A locale found empty is remembered for a short while, so idle locales
+are not rebuilt on every request.
+
+The queue is only a cache of the database: members are re-checked when they
+are handed out and stale ones are dropped, and `rebuild` recreates a locale
+from scratch. Callers fall back to querying the database whenever Redis is
+unavailable.
+"""
+import logging
+
+import redis
+from django.conf import settings
+from django.utils import timezone
+from redis.exceptions import RedisError
+
+from local_voice.utils.constants import ValidationStatus
+
+logger = logging.getLogger("app")
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+QUEUE_KEY_PREFIX = "validation_queue"
+# Seconds an empty locale is trusted before it is rebuilt again.
+EMPTY_QUEUE_TIMEOUT = 60
+# Audio ids stay well below this, so remaining slots dominate the score.
+SCORE_MULTIPLIER = 10**12
+# Added to the score of audios flagged for quality, to queue them last.
+FLAGGED_SCORE_OFFSET = 1000 * SCORE_MULTIPLIER
+# Audio fields needed to compute the free validation slots.
+SLOT_FIELDS = [
+    "id",
+    "locale",
+    "deleted",
+    "second_audio_status",
+    "validation_count",
+    "validation_assignment_count",
+    "leased_by_id",
+    "lease_expires_at",
+    "quality_flagged",
+]
+
+
+def queue_key(locale):
+    return f"{QUEUE_KEY_PREFIX}:{locale}"
+
+
+def empty_key(locale):
+    return f"{QUEUE_KEY_PREFIX}:{locale}:empty"
+
+
+def get_score(remaining, audio_id, quality_flagged=False):
+    score = remaining * SCORE_MULTIPLIER + audio_id
+    return score + FLAGGED_SCORE_OFFSET if quality_flagged else score
+
+
+def get_required_validation_count():
+    from setup.models import AppConfiguration
+
+    configuration = AppConfiguration.get_cached()
+    return configuration.required_audio_validation_count if configuration else 0
+
+
+def count_remaining_slots(required_audio_validation_count, validation_count, assignment_count):
+    return min(required_audio_validation_count - validation_count,
+               required_audio_validation_count - assignment_count)
+
+
+def get_remaining_slots(audio, required_audio_validation_count):
+    if audio.deleted or audio.second_audio_status != ValidationStatus.PENDING.value:
+        return 0
+    return count_remaining_slots(required_audio_validation_count, audio.validation_count,
+                                 audio.validation_assignment_count)
+
+
+def is_leased_to_other(audio, user, now):
+    """Audios leased on the web stay queued but are skipped until the lease ends."""
+    return audio.lease_expires_at is not None and audio.lease_expires_at > now \
+        and audio.leased_by_id != user.id
+
+
+def refresh(audio_ids, required_audio_validation_count=None):
+    """Re-score the given audios, removing those without free slots."""
+    from dashboard.models import Audio
+
+    audio_ids = list(audio_ids)
+    if not audio_ids:
+        return
+    if required_audio_validation_count is None:
+        required_audio_validation_count = get_required_validation_count()
+    audios = Audio.objects.filter(id__in=audio_ids).only(*SLOT_FIELDS)
+    try:
+        pipeline = redis_client.pipeline()
+        for audio in audios:
+            if not audio.locale:
+                continue
+            remaining = get_remaining_slots(audio,
+                                            required_audio_validation_count)
+            if remaining > 0:
+                pipeline.zadd(queue_key(audio.locale),
+                              {audio.id: get_score(remaining, audio.id, audio.quality_flagged)})
+            else:
+                pipeline.zrem(queue_key(audio.locale), audio.id)
+        pipeline.execute()
+    except RedisError as e:
+        logger.error(f"Validation queue refresh failed: {e}")
+
+
+def rebuild(locale):
+    """Recreate the queue of a locale from the database."""
+    from dashboard.models import Audio
+
+    required_audio_validation_count = get_required_validation_count()
+    audios = Audio.objects.filter(
+        deleted=False,
+        locale=locale,
+        second_audio_status=ValidationStatus.PENDING.value,
+        validation_count__lt=required_audio_validation_count)\
+        .values_list("id", "validation_count", "validation_assignment_count", "quality_flagged")
+
+    members = {}
+    for audio_id, validation_count, assignment_count, quality_flagged in audios.iterator():
+        remaining = count_remaining_slots(required_audio_validation_count, validation_count, assignment_count)
+        if remaining > 0:
+            members[audio_id] = get_score(remaining, audio_id, quality_flagged)
+
+    temp_key = queue_key(locale) + ":rebuild"
+    try:
+        pipeline = redis_client.pipeline()
+        pipeline.delete(temp_key)
+        if members:
+            pipeline.zadd(temp_key, members)
+            pipeline.rename(temp_key, queue_key(locale))
+            pipeline.delete(empty_key(locale))
+        else:
+            pipeline.delete(queue_key(locale))
+            pipeline.set(empty_key(locale), 1, ex=EMPTY_QUEUE_TIMEOUT)
+        pipeline.execute()
+    except RedisError as e:
+        logger.error(f"Validation queue rebuild failed: {e}")
+        return None
+    return len(members)
+
+
+def take(user, count):
+    """
+    Return up to `count` audio ids from the user's locale queue which the user
+    may validate, in queue order. Returns None when the queue is unavailable.
+    """
+    from dashboard.models import Audio
+
+    locale = user.locale
+    key = queue_key(locale)
+    try:
+        if not redis_client.exists(key):
+            # Audios queued since are added to the key by `refresh`.
+            if redis_client.exists(empty_key(locale)):
+                return []
+            if rebuild(locale) is None:
+                return None
+
+        required_audio_validation_count = get_required_validation_count()
+        now = timezone.now()
+        selected = []
+        start = 0
+        window = max(count * 2, 100)
+        while len(selected) < count:
+            members = [int(m) for m in redis_client.zrange(key, start, start + window - 1)]
+            if not members:
+                break
+            start += window
+
+            candidates = {
+                audio.id: audio
+                for audio in Audio.objects.filter(id__in=members).only(
+                    "submitted_by_id", *SLOT_FIELDS)
+            }
+            excluded = set(
+                Audio.objects.filter(id__in=members, validations__user=user)
+                .values_list("id", flat=True))
+
+            stale = []
+            for audio_id in members:
+                audio = candidates.get(audio_id)
+                if not audio or audio.locale != locale or get_remaining_slots(
+                        audio, required_audio_validation_count) <= 0:
+                    stale.append(audio_id)
+                elif audio_id not in excluded and audio.submitted_by_id != user.id \
+                        and not is_leased_to_other(audio, user, now):
+                    selected.append(audio_id)
+                    if len(selected) >= count:
+                        break
+            if stale:
+                redis_client.zrem(key, *stale)
+                start -= len(stale)
+    except RedisError as e:
+        logger.error(f"Validation queue unavailable: {e}")
+        return None
+    return selected
@@ -161,7 +161,7 @@ def check_transaction_status(transaction_id, rounds=5, wait=5):
 @shared_task()
 @db_transaction.atomic()
 def update_participants_amount(filterUnpaid=True):
-    configuration = AppConfiguration.objects.first()
+    configuration = AppConfiguration.get_cached()
     amount = configuration.individual_audio_aggregators_amount_per_audio if configuration else 0
     participants = Participant.objects.select_for_update().filter(
         excluded_from_payment=False, flatten=False)
@@ -178,7 +178,7 @@ def update_participants_amount(filterUnpaid=True):
 @shared_task()
 @db_transaction.atomic()
 def update_user_amounts():
-    configuration = AppConfiguration.objects.first()
+    configuration = AppConfiguration.get_cached()
     amount = configuration.audio_aggregators_amount_per_audio if configuration else 0
     amount_per_audio_validation = configuration.amount_per_audio_validation if configuration else 0
     TRANSCRIPTION_RATE = 0.7
@@ -1,12 +1,12 @@
 import json
 import logging
 import os
-import tempfile
 from datetime import datetime
 
-from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth.models import Group, Permission
+from django.core.files.storage import default_storage
+from django.db import IntegrityError
 from django.db.models import Q
 from django.utils.timezone import make_aware
 from mutagen import File as MFile
@@ -15,9 +15,10 @@ from rest_framework import serializers
 from accounts.models import User, Wallet
 from dashboard.models import (Audio, Category, Image, Notification,
                               Participant, Transcription, Validation)
+from local_voice.utils import audio_quality, upload_ingest, validation_queue
 from local_voice.utils.constants import ParticipantType, ValidationStatus
 from payments.models import Transaction
-from rest_api.tasks import convert_audio_file_to_mp3
+from rest_api.tasks import convert_audio_file_to_mp3, convert_audio_files_to_mp3
 from setup.models import AppConfiguration
 
 logger = logging.getLogger("app")
@@ -337,6 +338,14 @@ class ValidationSerializer(serializers.ModelSerializer):
         fields = ["user", "is_valid"]
 
 
+def get_rendition_urls(request, image):
+    """Return {rendition key: url} of `image`, keyed like "200.webp"."""
+    return {
+        key: request.build_absolute_uri(default_storage.url(file_name))
+        for key, file_name in image.get_renditions().items()
+    }
+
+
 class ImageSerializer(serializers.ModelSerializer):
     image_url = serializers.SerializerMethodField()
     categories = CategorySerializer(many=True, read_only=True)
@@ -344,6 +353,7 @@ class ImageSerializer(serializers.ModelSerializer):
     height = serializers.SerializerMethodField()
     width = serializers.SerializerMethodField()
     thumbnail = serializers.SerializerMethodField()
+    renditions = serializers.SerializerMethodField()
     category = serializers.SerializerMethodField()
     created_at = serializers.SerializerMethodField()
 
@@ -361,6 +371,9 @@ class ImageSerializer(serializers.ModelSerializer):
             return request.build_absolute_uri(obj.thumbnail.url)
         return self.get_image_url(obj)
 
+    def get_renditions(self, obj):
+        return get_rendition_urls(self.context.get("request"), obj)
+
     def get_height(self, obj):
         if obj.file:
             return obj.file.height
@@ -533,6 +546,40 @@ class AudioSerializer(serializers.ModelSerializer):
         fields = "__all__"
 
 
+class CompactAudioSerializer(serializers.ModelSerializer):
+    """Audio fields the mobile app needs to work on an audio offline."""
+    audio_url = serializers.SerializerMethodField()
+    image_url = serializers.SerializerMethodField()
+    thumbnail = serializers.SerializerMethodField()
+    image_renditions = serializers.SerializerMethodField()
+
+    def get_audio_url(self, obj):
+        request = self.context.get("request")
+        return obj.get_audio_url(request)
+
+    def get_thumbnail(self, obj):
+        request = self.context.get("request")
+        if obj.image.thumbnail:
+            return request.build_absolute_uri(obj.image.thumbnail.url)
+        return self.get_image_url(obj)
+
+    def get_image_renditions(self, obj):
+        return get_rendition_urls(self.context.get("request"), obj.image)
+
+    def get_image_url(self, obj):
+        request = self.context.get("request")
+        if obj.image.file:
+            return request.build_absolute_uri(obj.image.file.url)
+        return ""
+
+    class Meta:
+        model = Audio
+        fields = [
+            "id", "audio_url", "image_url", "thumbnail", "image_renditions",
+            "image", "locale", "duration"
+        ]
+
+
 class TranscriptionSerializer(serializers.ModelSerializer):
     audio = AudioSerializer(read_only=True)
     participant = ParticipantSerializer(read_only=True)
@@ -748,6 +795,19 @@ class PaymentUserSerializer(serializers.ModelSerializer):
         ]
 
 
+def check_audio_file(path, file_name, user):
+    """Return why the uploaded audio at `path` is refused, or None."""
+    # anaylyse file; mutagen only reads the headers
+    m_file = MFile(path)
+    if m_file is None:
+        return f"UNSUPPORTED_AUDIO_FORMAT, {file_name} {user}"
+    duration = round(m_file.info.length)
+
+    if duration < 15:
+        return f"MINIMUM_DURATION_NOT_MET, {file_name} {user}"
+    return None
+
+
 class AudioUploadSerializer(serializers.Serializer):
 
     class _AudioSerializer(serializers.Serializer):
@@ -772,20 +832,91 @@ class AudioUploadSerializer(serializers.Serializer):
     participant_data = _ParticipantSerializer(required=False)
 
     def create(self, request):
-        configuration = AppConfiguration.objects.first()
-        audio = None
-
         file = request.FILES.get("audio_file")
-        # anaylyse file
-        temp_file, temp_file_path = tempfile.mkstemp()
-        f = os.fdopen(temp_file, 'wb')
-        f.write(file.read())
-        f.close()
-        m_file = MFile(temp_file_path)
-        duration = round(m_file.info.length)
+        if not file:
+            return False, f"No file; by {request.user}"
 
-        if duration < 15:
-            return False, f"MINIMUM_DURATION_NOT_MET, {file} {request.user}"
+        # The upload is written once, next to its final location, and the
+        # temporary file is left behind only if it was not moved into place.
+        temp_file_path, content_hash = upload_ingest.stream_to_temp_file(file)
+        try:
+            return self.create_from_temp_file(request, file.name, temp_file_path, content_hash)
+        finally:
+            if os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+
+    @staticmethod
+    def resolve_participant(request, user, participant_data, re_upload, api_client, configuration):
+        """Find or create the participant of an upload. Returns it with the amount due."""
+        participant_object = None
+        amount = 0
+        if re_upload:
+            if participant_data:
+                participant_object = Participant.objects.filter(
+                    momo_number=participant_data.get("momoNumber"),
+                    network=participant_data.get("network", ""),
+                    fullname=participant_data.get("fullname"),
+                    gender=participant_data.get("gender"),
+                    submitted_by=user,
+                    age=participant_data.get("age")).order_by(
+                        "-paid").first()
+                amount = configuration.participant_amount_per_audio if configuration else 0
+            else:
+                participant_object = Participant.objects.filter(
+                    momo_number=user.phone,
+                    network=user.phone_network,
+                    submitted_by=user,
+                ).order_by("-paid").first()
+                amount = configuration.individual_audio_aggregators_amount_per_audio if configuration else 0
+        elif participant_data:
+            object_file = {
+                "momo_number": participant_data.get("momoNumber"),
+                "network": participant_data.get("network",  ""),
+                "fullname": participant_data.get("fullname"),
+                "gender": participant_data.get("gender"),
+                "submitted_by": request.user,
+                "age": participant_data.get("age"),
+                "accepted_privacy_policy": participant_data.get("acceptedPrivacyPolicy", False),
+                "api_client": api_client
+            }  # yapf: disable
+
+            participant_object = Participant.objects.filter(
+                **object_file).first()
+            if not participant_object:
+                participant_object = Participant.objects.create(
+                    **object_file)
+            amount = configuration.participant_amount_per_audio if configuration else 0
+        else:
+            object_file = {
+                "momo_number": user.phone,
+                "network": user.phone_network,
+                "fullname": user.fullname,
+                "gender": user.gender,
+                "submitted_by": user,
+                "age": user.age,
+                "type": ParticipantType.INDEPENDENT.value,
+                "accepted_privacy_policy": user.accepted_privacy_policy,
+                "api_client": api_client,
+            }  # yapf: disable
+            participant_object = Participant.objects.filter(
+                **object_file).first()
+            if not participant_object:
+                participant_object = Participant.objects.create(
+                    **object_file)
+            amount = configuration.individual_audio_aggregators_amount_per_audio if configuration else 0
+        return participant_object, amount
+
+    def create_from_temp_file(self, request, file_name, temp_file_path, content_hash):
+        """
+        Create the audio from an upload already written to `temp_file_path`,
+        with the metadata of the request.
+        """
+        configuration = AppConfiguration.get_cached()
+        audio = None
+
+        error = check_audio_file(temp_file_path, file_name, request.user)
+        if error:
+            return False, error
 
         re_upload = request.data.get("re_upload", False)
         api_client = request.data.get("api_client")
@@ -807,104 +938,206 @@ class AudioUploadSerializer(serializers.Serializer):
         if not image_object:
             return False, f"Invalid Image ID: {image_id}; by {request.user}"
 
-        if not file:
-            return False, f"No file: {image_id}; by {request.user}"
-
-        # Check for duplicate files.
-        new_file_path = settings.MEDIA_ROOT / "audios" / file.name
-        if os.path.isfile(new_file_path):
-            for audio in Audio.objects.filter(deleted=False):
-                if audio.file.path == str(new_file_path):
-                    logger.info(
-                        f"Audio already exists. {new_file_path}; by {request.user}"
-                    )
-                    return True, audio
+        # Check for duplicate files, whatever their name.
+        audio = Audio.objects.filter(content_hash=content_hash, deleted=False).first()
+        if audio:
+            logger.info(f"Audio already exists. {file_name}; by {request.user}")
+            return True, audio
         try:
-            if re_upload:
-                if participant_data:
-                    participant_object = Participant.objects.filter(
-                        momo_number=participant_data.get("momoNumber"),
-                        network=participant_data.get("network", ""),
-                        fullname=participant_data.get("fullname"),
-                        gender=participant_data.get("gender"),
+            participant_object, amount = self.resolve_participant(
+                request, user, participant_data, re_upload, api_client, configuration)
+
+            if image_object and audio_data and participant_object:
+                is_mp3 = len(file_name.split(".mp3")) > 1
+                quality_fields = audio_quality.get_audio_fields(
+                    audio_quality.measure(temp_file_path),
+                    configuration.max_background_noise_level if configuration else 100)
+
+                stored_file_name = upload_ingest.move_into_storage(temp_file_path, f"audios/{file_name}")
+                try:
+                    audio = Audio.objects.create(
+                        image=image_object,
                         submitted_by=user,
-                        age=participant_data.get("age")).order_by(
-                            "-paid").first()
-                    amount = configuration.participant_amount_per_audio
-                else:
-                    participant_object = Participant.objects.filter(
-                        momo_number=user.phone,
-                        network=user.phone_network,
-                        submitted_by=user,
-                    ).order_by("-paid").first()
-                    amount = configuration.individual_audio_aggregators_amount_per_audio if configuration else 0
-            elif participant_data:
-                object_file = {
-                    "momo_number": participant_data.get("momoNumber"),
-                    "network": participant_data.get("network",  ""),
-                    "fullname": participant_data.get("fullname"),
-                    "gender": participant_data.get("gender"),
-                    "submitted_by": request.user,
-                    "age": participant_data.get("age"),
-                    "accepted_privacy_policy": participant_data.get("acceptedPrivacyPolicy", False),
-                    "api_client": api_client
-                }  # yapf: disable
-
-                participant_object = Participant.objects.filter(
-                    **object_file).first()
-                if not participant_object:
-                    participant_object = Participant.objects.create(
-                        **object_file)
-                amount = configuration.participant_amount_per_audio
-            else:
-                object_file = {
-                    "momo_number": user.phone,
-                    "network": user.phone_network,
-                    "fullname": user.fullname,
-                    "gender": user.gender,
-                    "submitted_by": user,
-                    "age": user.age,
-                    "type": ParticipantType.INDEPENDENT.value,
-                    "accepted_privacy_policy": user.accepted_privacy_policy,
-                    "api_client": api_client,
-                }  # yapf: disable
-                participant_object = Participant.objects.filter(
-                    **object_file).first()
-                if not participant_object:
-                    participant_object = Participant.objects.create(
-                        **object_file)
-                amount = configuration.individual_audio_aggregators_amount_per_audio if configuration else 0
-
-            if image_object and file and audio_data and participant_object:
-                file_mp3 = None
-                if (len(file.name.split(".mp3")) > 1):
-                    file_mp3 = file
-
-                audio = Audio.objects.create(
-                    image=image_object,
-                    submitted_by=user,
-                    file=file,
-                    duration=audio_data.get("duration"),
-                    locale=user.locale,
-                    device_id=audio_data.get("device_id"),
-                    environment=audio_data.get(
-                        "environment") or request.user.recording_environment,
-                    participant=participant_object,
-                    main_file_format="mp3" if file_mp3 else "wav",
-                    api_client=api_client)
+                        file=stored_file_name,
+                        duration=audio_data.get("duration"),
+                        locale=user.locale,
+                        device_id=audio_data.get("device_id"),
+                        environment=audio_data.get(
+                            "environment") or request.user.recording_environment,
+                        participant=participant_object,
+                        main_file_format="mp3" if is_mp3 else "wav",
+                        api_client=api_client,
+                        content_hash=content_hash,
+                        **quality_fields)
+                except Exception:
+                    default_storage.delete(stored_file_name)
+                    raise
 
                 # participant_object.update_amount(amount)
+                validation_queue.refresh([audio.id])
 
                 # Convert audio to mp3
-                if not file_mp3:
+                if not is_mp3:
                     convert_audio_file_to_mp3.delay(audio.id)
 
+        except IntegrityError:
+            # The same file was saved by a concurrent upload.
+            audio = Audio.objects.filter(content_hash=content_hash, deleted=False).first()
+            if not audio:
+                raise
+            logger.info(f"Audio already exists. {file_name}; by {request.user}")
         except Exception as e:
             logger.error(f"{str(e)}; {request.user}")
             return False, str(e)
         return True, audio
 
 
+class AudioUploadSessionSerializer(AudioUploadSerializer):
+    """Metadata sent to finalize an upload session; the file came in chunks."""
+    audio_file = None
+
+
+class CrawlerImagesSerializer(serializers.Serializer):
+    MAX_URLS = 1000
+
+    urls = serializers.ListField(child=serializers.URLField(max_length=200),
+                                 allow_empty=False,
+                                 max_length=MAX_URLS)
+
+
+class AudioBatchUploadSerializer(serializers.Serializer):
+    """
+    Metadata of many audios recorded with one participant and uploaded in one
+    request. `audio_data` describes the `audio_files`, in the same order.
+    """
+    MAX_FILES = 50
+
+    class _AudioSerializer(AudioUploadSerializer._AudioSerializer):
+        userId = serializers.IntegerField(required=False)
+        environment = serializers.CharField(required=False, allow_blank=True)
+
+    api_client = serializers.CharField(max_length=30,
+                                       required=False,
+                                       default="Kotlin")
+    audio_data = _AudioSerializer(many=True)
+    participant_data = AudioUploadSerializer._ParticipantSerializer(required=False)
+
+    def create(self, request, files):
+        """
+        Create the audios of `files`, resolving the participant once and
+        inserting the rows together. Returns the result of each file.
+        """
+        configuration = AppConfiguration.get_cached()
+        re_upload = request.data.get("re_upload", False)
+        api_client = self.validated_data.get("api_client")
+        audio_data = self.validated_data["audio_data"]
+        participant_data = self.validated_data.get("participant_data")
+
+        results = [{"file_name": file.name, "result": "invalid", "audio_id": None} for file in files]
+        uploads = []
+        temp_file_paths = []
+        try:
+            for index, (file, entry) in enumerate(zip(files, audio_data)):
+                temp_file_path, content_hash = upload_ingest.stream_to_temp_file(file)
+                temp_file_paths.append(temp_file_path)
+                error = check_audio_file(temp_file_path, file.name, request.user)
+                if error:
+                    results[index]["message"] = error
+                else:
+                    uploads.append((index, file.name, entry, temp_file_path, content_hash))
+
+            images = Image.objects.in_bulk([entry.get("remoteImageID") for _, _, entry, _, _ in uploads])
+            existing = dict(Audio.objects.filter(content_hash__in=[upload[4] for upload in uploads],
+                                                 deleted=False).values_list("content_hash", "id"))
+            new_uploads = {}
+            for index, file_name, entry, temp_file_path, content_hash in uploads:
+                if entry.get("remoteImageID") not in images:
+                    results[index]["message"] = f"Invalid Image ID: {entry.get('remoteImageID')}; by {request.user}"
+                elif content_hash in existing:
+                    results[index].update(result="duplicate", audio_id=existing[content_hash])
+                elif content_hash in new_uploads:
+                    # The same file twice in the batch; resolved once inserted.
+                    results[index]["result"] = "duplicate"
+                else:
+                    new_uploads[content_hash] = (index, file_name, entry, temp_file_path)
+            if not new_uploads:
+                return self.fill_duplicates(results, uploads, {})
+
+            user_id = audio_data[0].get("userId", -1)
+            user = User.objects.filter(id=user_id).first() or request.user
+            participant_object, amount = AudioUploadSerializer.resolve_participant(
+                request, user, participant_data, re_upload, api_client, configuration)
+            if not participant_object:
+                for index, _, _, _ in new_uploads.values():
+                    results[index]["message"] = "No participant"
+                return self.fill_duplicates(results, uploads, {})
+
+            max_background_noise_level = configuration.max_background_noise_level if configuration else 100
+            audios = []
+            for content_hash, (index, file_name, entry, temp_file_path) in new_uploads.items():
+                quality_fields = audio_quality.get_audio_fields(audio_quality.measure(temp_file_path),
+                                                                max_background_noise_level)
+                stored_file_name = upload_ingest.move_into_storage(temp_file_path, f"audios/{file_name}")
+                audios.append(Audio(
+                    image=images[entry.get("remoteImageID")],
+                    submitted_by=user,
+                    file=stored_file_name,
+                    duration=entry.get("duration"),
+                    locale=user.locale,
+                    device_id=entry.get("device_id"),
+                    environment=entry.get("environment") or request.user.recording_environment,
+                    participant=participant_object,
+                    main_file_format="mp3" if ".mp3" in file_name else "wav",
+                    api_client=api_client,
+                    content_hash=content_hash,
+                    **quality_fields,
+                ))
+            # Files saved meanwhile by concurrent uploads are skipped, then
+            # told apart from the inserted ones by their stored name.
+            try:
+                Audio.objects.bulk_create(audios, ignore_conflicts=True)
+            except Exception:
+                for audio in audios:
+                    default_storage.delete(audio.file.name)
+                raise
+            stored_files = {audio.content_hash: audio.file.name for audio in audios}
+            saved = {
+                content_hash: (audio_id, file_name, main_file_format)
+                for content_hash, audio_id, file_name, main_file_format in Audio.objects.filter(
+                    content_hash__in=stored_files.keys(), deleted=False).values_list(
+                        "content_hash", "id", "file", "main_file_format")
+            }
+
+            created_ids, wav_ids = [], []
+            for content_hash, (index, _, _, _) in new_uploads.items():
+                audio_id, file_name, main_file_format = saved[content_hash]
+                if file_name == stored_files[content_hash]:
+                    results[index].update(result="created", audio_id=audio_id)
+                    created_ids.append(audio_id)
+                    if main_file_format != "mp3":
+                        wav_ids.append(audio_id)
+                else:
+                    default_storage.delete(stored_files[content_hash])
+                    results[index].update(result="duplicate", audio_id=audio_id)
+
+            validation_queue.refresh(created_ids)
+            if wav_ids:
+                convert_audio_files_to_mp3.delay(wav_ids)
+            return self.fill_duplicates(results, uploads, {h: saved[h][0] for h in new_uploads})
+        finally:
+            for temp_file_path in temp_file_paths:
+                if os.path.exists(temp_file_path):
+                    os.remove(temp_file_path)
+
+    @staticmethod
+    def fill_duplicates(results, uploads, audio_ids):
+        """Point files repeated within the batch to the audio of their content."""
+        for index, _, _, _, content_hash in uploads:
+            if results[index]["result"] == "duplicate" and results[index]["audio_id"] is None:
+                results[index]["audio_id"] = audio_ids.get(content_hash)
+        return results
+
+
 class EnumeratorSerialiser(serializers.ModelSerializer):
     fullname = serializers.SerializerMethodField()
 
@@ -1,22 +1,30 @@
 import logging
 import os
+import time
 import zipfile
-from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from io import BytesIO
 
-import ffmpeg
 import pandas as pd
 from celery import shared_task
 from django.conf import settings
-from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.db import NotSupportedError
-from django.db.models import Count, Q
+from django.db.models import Q
+from PIL import Image as PillowImage
 
 from accounts.models import User
+from dashboard.assignments import expire_assigned_audios
 from dashboard.models import (Audio, AudioTranscriptionAssignment,
-                              AudioValidationAssignment, ExportTag,
+                              AudioValidationAssignment, ExportTag, Image, ImageBatch,
                               TranscriptionResolutionAssignment,
                               Notification, Transcription)
+from local_voice.utils import (crawler, renditions, transcoder, upload_ingest,
+                               validation_queue)
 from local_voice.utils.constants import TranscriptionStatus, ValidationStatus
+from local_voice.utils.sampling import random_sample
 from setup.models import AppConfiguration
 
 logger = logging.getLogger("app")
@@ -89,15 +97,14 @@ def export_audio_data(user_id, data, base_url):
             transcription_status=TranscriptionStatus.ACCEPTED.value)
 
     if status == "transcribed":
-        audios = audios.annotate(t_count=Count("transcriptions")).filter(
-            t_count__gt=0)
+        audios = audios.filter(transcription_count__gt=0)
 
     if randomise:
-        audios = audios.order_by("?")
+        audios = random_sample(audios, number_of_files)
     else:
         audios = audios.order_by("id")
-    if number_of_files > 0:
-        audios = audios[:number_of_files]
+        if number_of_files > 0:
+            audios = audios[:number_of_files]
 
     if skip > 0:
         audios = audios[skip:]
@@ -177,54 +184,207 @@ def export_audio_data(user_id, data, base_url):
         user_id=user_id)
 
 
+# Files converted between two checkpoints of convert_files_to_mp3.
+TRANSCODE_CHUNK_SIZE = 200
+
+
+def get_mp3_file_name(file_name):
+    return file_name.split(".wav")[0] + ".mp3"
+
+
+def attach_mp3_file(audio_id, temp_file_path, file_name):
+    """
+    Rename a converted file into storage as the mp3 of the audio and update
+    only the fields it changes. Returns whether it was kept.
+    """
+    try:
+        if os.path.getsize(temp_file_path) < (1024 * 10):
+            return False
+        audio = Audio.objects.filter(id=audio_id).only("id", "file", "file_mp3", "main_file_format").first()
+        if not audio:
+            return False
+
+        audio.file_mp3 = upload_ingest.move_into_storage(temp_file_path, file_name)
+        audio.main_file_format = "mp3"
+        audio.save(update_fields=["file_mp3", "main_file_format", "updated_at"])
+        return True
+    except Exception as e:
+        logger.error(str(e))
+        return False
+    finally:
+        if os.path.isfile(temp_file_path):
+            os.remove(temp_file_path)
+
+
+def convert_chunk_to_mp3(executor, audios):
+    """
+    Convert (audio id, file name) pairs on the executor, attaching the results
+    from this thread. Returns the number of converted and failed files.
+    """
+    jobs = []
+    for audio_id, file_name in audios:
+        if ".mp3" not in file_name:
+            jobs.append((audio_id,
+                         default_storage.path(file_name),
+                         upload_ingest.create_temp_file(suffix=".mp3"),
+                         get_mp3_file_name(file_name)))
+
+    converted = failed = 0
+    results = executor.map(lambda job: transcoder.transcode(job[1], job[2]), jobs)
+    for (audio_id, _, temp_file_path, mp3_file_name), transcoded in zip(jobs, results):
+        if transcoded and attach_mp3_file(audio_id, temp_file_path, mp3_file_name):
+            converted += 1
+        else:
+            failed += 1
+            if os.path.isfile(temp_file_path):
+                os.remove(temp_file_path)
+    return converted, failed
+
+
 @shared_task()
 def convert_files_to_mp3(second_audio_status=None):
+    """
+    Convert every wav audio without an mp3, a chunk at a time on a pool sized
+    to the cores. Progress is checkpointed after each chunk, so a restarted
+    run skips the audios already tried.
+    """
     audios = Audio.objects.filter(
         main_file_format="wav").filter(Q(file_mp3=None) | Q(
-            file_mp3="")).order_by("validation_count")
+            file_mp3=""))
     if second_audio_status:
         audios = audios.filter(second_audio_status=second_audio_status)
-    audios = audios.values("id")
 
-    for item in audios:
-        convert_audio_file_to_mp3(item.get("id"))
+    checkpoint_name = f"convert_files_to_mp3:{second_audio_status or 'all'}"
+    last_id = transcoder.load_checkpoint(checkpoint_name)
+    converted = failed = 0
+    started_at = time.monotonic()
+    with ThreadPoolExecutor(max_workers=transcoder.get_pool_size()) as executor:
+        while True:
+            chunk = list(audios.filter(id__gt=last_id).order_by("id").values_list(
+                "id", "file")[:TRANSCODE_CHUNK_SIZE])
+            if not chunk:
+                break
+
+            chunk_converted, chunk_failed = convert_chunk_to_mp3(executor, chunk)
+            converted += chunk_converted
+            failed += chunk_failed
+
+            last_id = chunk[-1][0]
+            transcoder.save_checkpoint(checkpoint_name, last_id)
+            elapsed = time.monotonic() - started_at
+            logger.info(f"Converted {converted} files to mp3, {failed} failed, "
+                        f"{(converted + failed) / elapsed:.2f} files/s")
+
+    transcoder.clear_checkpoint(checkpoint_name)
+    elapsed = time.monotonic() - started_at
+    return f"Converted {converted} files, {failed} failed, {(converted + failed) / max(elapsed, 1e-6):.2f} files/s"
 
 
 @shared_task()
 def convert_audio_file_to_mp3(audio_id):
     audio = Audio.objects.filter(id=audio_id).first()
-    if audio and audio.file_mp3 and os.path.isfile(audio.file_mp3.path):
+    if not audio or audio.file_mp3 and os.path.isfile(audio.file_mp3.path):
         return
 
-    input_file = audio.file.path
-    if not input_file or ".mp3" in input_file:
+    if not audio.file or ".mp3" in audio.file.name:
         return
 
-    output_file = input_file.split(".wav")[0] + ".mp3"
-    if not output_file:
-        return
-    try:
-        stream = ffmpeg.input(input_file)
-        stream = ffmpeg.output(stream, output_file)
-        res = ffmpeg.run(stream, quiet=True, overwrite_output=True)
-    except Exception as e:
-        logger.error(str(e))
-        return
+    temp_file_path = upload_ingest.create_temp_file(suffix=".mp3")
+    if transcoder.transcode(audio.file.path, temp_file_path):
+        attach_mp3_file(audio_id, temp_file_path, get_mp3_file_name(audio.file.name))
+    elif os.path.isfile(temp_file_path):
+        os.remove(temp_file_path)
 
-    # Update audio object
+
+@shared_task()
+def convert_audio_files_to_mp3(audio_ids):
+    """Convert the audios of a batch upload in one job."""
+    audios = Audio.objects.filter(id__in=audio_ids, main_file_format="wav")\
+        .filter(Q(file_mp3=None) | Q(file_mp3="")).values_list("id", "file")
+    with ThreadPoolExecutor(max_workers=transcoder.get_pool_size()) as executor:
+        converted, failed = convert_chunk_to_mp3(executor, audios)
+    return f"Converted {converted} files, {failed} failed"
+
+
+# Crawled images inserted together. Their content is written to storage as
+# each fetch completes, so only renditions are held until the insert.
+CRAWLER_CHUNK_SIZE = 100
+MIN_CRAWLED_IMAGE_SIZE = 400
+
+
+def build_crawled_image(url, content, index):
+    """
+    Return an unsaved image for the fetched content, stored along with its
+    renditions, or None if it is not usable.
+    """
     try:
-        audio = Audio.objects.filter(id=audio_id).first()
-        if not audio or os.path.getsize(output_file) < (1024 * 10):
-            return
+        opened, (width, height) = renditions.open_image(BytesIO(content))
+        if width < MIN_CRAWLED_IMAGE_SIZE or height < MIN_CRAWLED_IMAGE_SIZE:
+            return None
+        name = f"{time.time_ns()}{index}.jpg"
+        image = Image(source_url=url, name=name, is_downloaded=True)
+        image.set_renditions(opened)
+        image.file = default_storage.save(f"images/{name}", ContentFile(content))
+        return image
+    except (OSError, ValueError, PillowImage.DecompressionBombError) as e:
+        logger.info(f"Could not read the image at {url}: {e}")
+        return None
 
-        audio.file_mp3 = File(open(output_file, "rb"),
-                              output_file.split("/")[-1])
-        audio.main_file_format = "mp3"
-        if os.path.isfile(output_file):
-            os.remove(output_file)
-        audio.save()
-    except Exception as e:
-        logger.error(str(e))
+
+def delete_image_files(image):
+    for file_name in [image.file.name, *image.get_renditions().values()]:
+        default_storage.delete(file_name)
+
+
+@shared_task()
+def ingest_crawler_images(urls):
+    """
+    Fetch the images at `urls` concurrently and insert those large enough,
+    skipping urls already ingested.
+    """
+    urls = list(dict.fromkeys(urls))
+    created = existing = failed = 0
+    start_time = time.time()
+    with crawler.create_session() as session:
+        for start in range(0, len(urls), CRAWLER_CHUNK_SIZE):
+            chunk = urls[start:start + CRAWLER_CHUNK_SIZE]
+            known = set(Image.objects.filter(source_url__in=chunk).values_list("source_url", flat=True))
+            existing += len(known)
+
+            images = []
+            fetched = crawler.fetch_all(session, [url for url in chunk if url not in known])
+            for index, (url, content) in enumerate(fetched):
+                image = build_crawled_image(url, content, start + index) if content else None
+                if image:
+                    images.append(image)
+                else:
+                    failed += 1
+            if not images:
+                continue
+
+            # Urls ingested meanwhile by another run are skipped, then told
+            # apart from the inserted ones by their stored name.
+            try:
+                Image.objects.bulk_create(images, ignore_conflicts=True)
+            except Exception:
+                for image in images:
+                    delete_image_files(image)
+                raise
+            stored = dict(Image.objects.filter(source_url__in=[image.source_url for image in images])
+                          .values_list("source_url", "file"))
+            for image in images:
+                if stored.get(image.source_url) == image.file.name:
+                    created += 1
+                else:
+                    delete_image_files(image)
+                    if image.source_url in stored:
+                        existing += 1
+                    else:
+                        failed += 1
+
+    elapsed = time.time() - start_time
+    logger.info(f"Ingested {created} crawled images in {elapsed:.1f}s ({len(urls) / max(elapsed, 0.001):.1f} urls/s)")
+    return f"Created {created} images; {existing} already existed, {failed} failed"
 
 
 def get_audios_rejected(user):
@@ -326,41 +486,52 @@ def update_user_stats():
 
 @shared_task()
 def release_audios_not_being_validated_by_users_assigned():
-    configuration = AppConfiguration.objects.first()
+    configuration = AppConfiguration.get_cached()
     hours_to_keep_audios_for_validation = configuration.hours_to_keep_audios_for_validation if configuration else 6
 
-    expiry_date = datetime.now() - timedelta(
-        hours=hours_to_keep_audios_for_validation)
-    forgotten_assignments = AudioValidationAssignment.objects.filter(
-        created_at__lte=expiry_date)
-    deleted, _ = forgotten_assignments.delete()
-    logger.info(f"Made {deleted} audios available for reassignment.")
+    audio_ids = expire_assigned_audios(AudioValidationAssignment,
+                                       hours_to_keep_audios_for_validation)
+    validation_queue.refresh(set(audio_ids))
+    logger.info(f"Made {len(audio_ids)} audios available for reassignment.")
+
+
+@shared_task()
+def rebuild_validation_queues():
+    locales = Audio.objects.filter(
+        deleted=False,
+        second_audio_status=ValidationStatus.PENDING.value).exclude(
+            locale=None).values_list("locale", flat=True).distinct()
+    for locale in locales:
+        queued = validation_queue.rebuild(locale)
+        logger.info(f"Queued {queued} audios for validation in {locale}.")
+
+
+@shared_task()
+def reconcile_image_batch_counts():
+    """Recount batch users, catching batch changes made outside the API."""
+    configuration = AppConfiguration.get_cached()
+    number_of_batches = configuration.number_of_batches if configuration else 8
+    ImageBatch.reconcile(number_of_batches)
 
 
 @shared_task()
 def release_audios_not_being_transcribed_by_users_assigned():
-    configuration = AppConfiguration.objects.first()
+    configuration = AppConfiguration.get_cached()
     hours_to_keep_audios_for_transcription = configuration.hours_to_keep_audios_for_transcription if configuration else 6
 
-    expiry_date = datetime.now() - timedelta(
-        hours=hours_to_keep_audios_for_transcription)
-    forgotten_assignments = AudioTranscriptionAssignment.objects.filter(
-        created_at__lte=expiry_date)
-    deleted, _ = forgotten_assignments.delete()
-    logger.info(f"Made {deleted} audios available for reassignment.")
+    audio_ids = expire_assigned_audios(AudioTranscriptionAssignment,
+                                       hours_to_keep_audios_for_transcription)
+    logger.info(f"Made {len(audio_ids)} audios available for reassignment.")
 
 
 @shared_task()
 def release_transcriptions_not_being_resolve_by_users_assigned():
-    configuration = AppConfiguration.objects.first()
+    configuration = AppConfiguration.get_cached()
     hours_to_keep_audios_for_transcription = configuration.hours_to_keep_audios_for_transcription if configuration else 6
 
-    expiry_date = datetime.now() - timedelta(
-        hours=hours_to_keep_audios_for_transcription)
-    forgotten_assignments = TranscriptionResolutionAssignment.objects.filter(
-        created_at__lte=expiry_date)
-    deleted, _ = forgotten_assignments.delete()
-    logger.info(f"Made {deleted} audios available for reassignment.")
+    audio_ids = expire_assigned_audios(TranscriptionResolutionAssignment,
+                                       hours_to_keep_audios_for_transcription)
+    logger.info(f"Made {len(audio_ids)} audios available for reassignment.")
 
 
 @shared_task()
@@ -443,15 +614,14 @@ def upload_file_to_drop_box(user_id, data, base_url):
             transcription_status=TranscriptionStatus.ACCEPTED.value)
 
     if status == "transcribed":
-        audios = audios.annotate(t_count=Count("transcriptions")).filter(
-            t_count__gt=0)
+        audios = audios.filter(transcription_count__gt=0)
 
     if randomise:
-        audios = audios.order_by("?")
+        audios = random_sample(audios, number_of_files)
     else:
         audios = audios.order_by("id")
-    if number_of_files > 0:
-        audios = audios[:number_of_files]
+        if number_of_files > 0:
+            audios = audios[:number_of_files]
 
     if skip > 0:
         audios = audios[skip:]
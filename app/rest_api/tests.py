@@ -1,3 +1,110 @@
-from django.test import TestCase
+import shutil
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from PIL import Image as PillowImage
+
+from dashboard.models import Image
+from local_voice.utils import crawler
+from rest_api.tasks import ingest_crawler_images
+
+
+def encode_image(width, height):
+    output = BytesIO()
+    PillowImage.new("RGB", (width, height), (30, 120, 200)).save(output, "JPEG")
+    return output.getvalue()
+
+
+class ImageHandler(BaseHTTPRequestHandler):
+    """Serves `/large.jpg`, `/small.jpg` and slow `/slow/<n>.jpg`; 404 otherwise."""
+    protocol_version = "HTTP/1.1"
+    images = {"/large.jpg": encode_image(800, 600), "/small.jpg": encode_image(100, 100)}
+    lock = threading.Lock()
+    in_flight = 0
+    max_in_flight = 0
+
+    def do_GET(self):
+        if self.path.startswith("/slow/"):
+            cls = type(self)
+            with cls.lock:
+                cls.in_flight += 1
+                cls.max_in_flight = max(cls.max_in_flight, cls.in_flight)
+            time.sleep(0.1)
+            with cls.lock:
+                cls.in_flight -= 1
+            content = self.images["/small.jpg"]
+        elif self.path in self.images:
+            content = self.images[self.path]
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/jpeg")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class CrawlerIngestionTest(TestCase):
+    """Ingest crawled images from a local HTTP server."""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), ImageHandler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_ingests_large_images_once(self):
+        urls = [f"{self.base_url}/large.jpg", f"{self.base_url}/small.jpg", f"{self.base_url}/missing.jpg"]
+
+        self.assertEqual(ingest_crawler_images(urls + urls[:1]),
+                         "Created 1 images; 0 already existed, 2 failed")
+        image = Image.objects.get()
+        self.assertEqual(image.source_url, urls[0])
+        self.assertTrue(image.is_downloaded)
+        self.assertEqual(image.file.width, 800)
+        self.assertEqual(PillowImage.open(image.thumbnail).size, (200, 150))
+        self.assertIn("600.jpg", image.renditions)
+
+        self.assertEqual(ingest_crawler_images(urls[:1]), "Created 0 images; 1 already existed, 0 failed")
+        self.assertEqual(Image.objects.count(), 1)
+
+    def test_limits_requests_per_host(self):
+        ImageHandler.max_in_flight = 0
+        urls = [f"{self.base_url}/slow/{i}.jpg" for i in range(6)]
+        with crawler.create_session() as session:
+            results = list(crawler.fetch_all(session, urls, max_workers=6, max_requests_per_host=2))
+
+        self.assertEqual(sorted(url for url, _ in results), urls)
+        self.assertTrue(all(content for _, content in results))
+        self.assertEqual(ImageHandler.max_in_flight, 2)
+
+    def test_busy_host_does_not_hold_up_others(self):
+        urls = [f"{self.base_url}/slow/{i}.jpg" for i in range(6)]
+        other_url = f"http://localhost:{self.server.server_port}/large.jpg"
+        with crawler.create_session() as session:
+            results = list(crawler.fetch_all(session, urls + [other_url], max_workers=3, max_requests_per_host=2))
+
+        # The third worker fetches the other host while the first one is busy.
+        self.assertEqual(results[0][0], other_url)
@@ -13,6 +13,10 @@ urlpatterns = [
     path("get-mobile-app-configurations/", views.MobileAppConfigurationAPI.as_view()),
     path("get-assigned-images/", views.GetAssignedImagesAPI.as_view()),
     path("upload-audio/", views.UploadAudioAPI.as_view()),
+    path("upload-audios/", views.UploadAudiosAPI.as_view()),
+    path("upload-sessions/", views.CreateUploadSessionAPI.as_view()),
+    path("upload-sessions/<uuid:session_id>/", views.UploadSessionAPI.as_view()),
+    path("upload-sessions/<uuid:session_id>/finalize/", views.FinalizeUploadSessionAPI.as_view()),
     path("auth/user-permissions/", views.MyPermissions.as_view()),
     path("auth/logout/", views.LogoutApiView.as_view()),
     path("search-users", views.SearchUser.as_view()),
@@ -29,7 +33,9 @@ urlpatterns += [
 
     path("validate-image/", views.ValidateImage.as_view()),
     path("validate-audio/", views.ValidateAudio.as_view()),
+    path("validate-audios/", views.BulkValidateAudios.as_view()),
     path("submit-transcription/", views.SubmitTranscription.as_view()),
+    path("submit-transcriptions/", views.BulkSubmitTranscriptions.as_view()),
     path("validate-transcription/", views.ValidateTranscription.as_view()),  # deprecated
 
     path("categories/", views.CategoriesAPI.as_view()),
@@ -64,6 +70,7 @@ urlpatterns += [
 
 urlpatterns += [
     path("submit-crawler-images/", views.SubmitCrawlerImages.as_view()),
+    path("submit-crawler-images/bulk/", views.SubmitCrawlerImagesBulk.as_view()),
     path("add-image/", views.AddImageToDatabase.as_view()),
     path("web-app-configurations/", views.WebAppConfigurations.as_view()),
 ]
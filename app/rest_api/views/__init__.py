@@ -4,11 +4,14 @@ from io import BytesIO
 import requests
 from django.core import files
 from django.core.files.base import ContentFile
-from PIL import Image as PillowImage
 from rest_framework import generics, permissions
 from rest_framework.response import Response
 
 from dashboard.models import Image
+from local_voice.utils import crawler, renditions
+from rest_api.permissions import APILevelPermissionCheck
+from rest_api.serializers import CrawlerImagesSerializer
+from rest_api.tasks import ingest_crawler_images
 
 from .common import *
 from .mobile_app import *
@@ -23,26 +26,20 @@ class SubmitCrawlerImages(generics.GenericAPIView):
         filename = source_url.split("/")[-1].split("?")[-1]
         filename = str(time.time_ns()) + f".jpg"
 
-        response = requests.get(source_url)
+        response = requests.get(source_url, timeout=crawler.FETCH_TIMEOUT)
         if response.status_code != requests.codes.ok:
             return Response({"message": "error"}, status=400)
 
         try:
-            image = PillowImage.open(BytesIO(response.content))
-            thumbnail = PillowImage.open(BytesIO(response.content))
-            thumbnail.thumbnail((200, 200), PillowImage.ANTIALIAS)
-            thumb_io = BytesIO()
-            thumbnail = thumbnail.convert('RGB')
-            thumbnail.save(thumb_io, "jpeg", quality=50)
-
-            width, height = image.size
+            image, (width, height) = renditions.open_image(BytesIO(response.content))
             if width >= 400 and height >= 400:
-                i = Image.objects.create(
+                i = Image(
                     source_url=source_url,
                     name=filename,
                     is_downloaded=True,
-                    thumbnail=files.File(thumb_io, filename),
                     file=files.File(ContentFile(response.content), filename))
+                i.set_renditions(image)
+                i.save()
 
             total_images = Image.objects.filter(deleted=False).count()
             return Response(
@@ -57,6 +54,25 @@ class SubmitCrawlerImages(generics.GenericAPIView):
         return Response({"message": "error"}, status=400)
 
 
+class SubmitCrawlerImagesBulk(generics.GenericAPIView):
+    """
+    Queue the images at many crawled urls for download in the background.
+    Expects `urls`, a list of image urls.
+    """
+    permission_classes = [permissions.IsAuthenticated, APILevelPermissionCheck]
+    required_permissions = ["setup.manage_collected_data"]
+    serializer_class = CrawlerImagesSerializer
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.serializer_class(data=request.data)
+        if not serializer.is_valid():
+            return Response({"message": str(serializer.errors), "status": "error"}, 400)
+
+        urls = serializer.validated_data["urls"]
+        ingest_crawler_images.delay(urls)
+        return Response({"message": "queued", "count": len(urls)}, 202)
+
+
 class AddImageToDatabase(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
 
@@ -84,6 +100,6 @@ class AddImageToDatabase(generics.GenericAPIView):
             return Response({"error": str(e)})
 
         if image:
-            image.create_image_thumbnail()
+            image.create_renditions()
 
         return Response({"message": "success"}, status=200)
@@ -1,7 +1,7 @@
 import logging
 
 from django.contrib.auth import authenticate, logout
-from django.db.models import Count, Q
+from django.db.models import Q
 from knox.models import AuthToken
 from rest_framework import generics, permissions, status
 from rest_framework.exceptions import ValidationError
@@ -11,8 +11,10 @@ from django.utils.decorators import method_decorator
 
 from accounts.forms import UserForm
 from accounts.models import User
+from app_statistics.tasks import validate_audio_transcriptions
 from dashboard.models import Audio, Transcription
-from local_voice.utils.constants import TranscriptionStatus, ValidationStatus
+from local_voice.utils.constants import (LeaseDuration, TranscriptionStatus,
+                                         ValidationStatus)
 from local_voice.utils.functions import get_all_user_permissions
 from rest_api.permissions import APILevelPermissionCheck
 from rest_api.serializers import (AudioSerializer, LoginSerializer,
@@ -58,7 +60,7 @@ class UserRegistrationAPI(generics.GenericAPIView):
                 user.lead = lead
                 user.locale = lead.locale
 
-            configuration = AppConfiguration.objects.first()
+            configuration = AppConfiguration.get_cached()
             if configuration.default_user_group:
                 user.groups.add(configuration.default_user_group)
             user.save()
@@ -249,26 +251,23 @@ class GetAudiosToValidate(generics.GenericAPIView):
     serializer_class = AudioSerializer
 
     def get(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         offset = request.GET.get("offset", -1)
         required_audio_validation_count = configuration.required_audio_validation_count if configuration else 0
 
         user_email_prefix = request.user.email_address.split("@")[0]
-        audios = Audio.objects.annotate(vals_count=Count("validations", filter=Q(validations__archived=False))).filter(
+        audios = Audio.objects.filter(
             deleted=False,
-            assignments=None,
+            validation_assignment_count=0,
             second_audio_status=ValidationStatus.PENDING.value,
-            vals_count__lt=required_audio_validation_count)\
+            validation_count__lt=required_audio_validation_count)\
             .exclude(Q(validations__user=request.user) | Q(submitted_by__email_address__startswith=user_email_prefix) | Q(id=offset)) \
-            .order_by("-vals_count", "image", "id")
+            .order_by("quality_flagged", "-validation_count", "image", "id")
 
         if not request.user.is_superuser:
             audios = audios.filter(locale=request.user.locale)
 
-        audio = audios.first()
-        if audio:
-            audio.second_audio_status = ValidationStatus.IN_REVIEW.value
-            audio.save()
+        audio = Audio.claim(audios, request.user, LeaseDuration.VALIDATION.value)
 
         data = self.serializer_class(audio, context={
             "request": request
@@ -286,23 +285,72 @@ class ValidateAudio(generics.GenericAPIView):
     def post(self, request, *args, **kwargs):
         audio_id = request.data.get("id")
         status = request.data.get("status")
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_audio_validation_count = configuration.required_audio_validation_count if configuration else 2
-        audio = Audio.objects.annotate(vals_count=Count("validations", filter=Q(validations__archived=False))).filter(
+        audio = Audio.objects.filter(
             id=audio_id,
             deleted=False,
-            vals_count__lt=required_audio_validation_count,
+            validation_count__lt=required_audio_validation_count,
         ).exclude(
             Q(second_audio_status=ValidationStatus.ACCEPTED.value)
             | Q(second_audio_status=ValidationStatus.REJECTED.value)).first()
         if audio:
             audio.validate(request.user, status)
+            audio.release_lease(request.user)
         return Response({
             "message": "Validation recorded.",
             "status": "success",
         })
 
 
+class BulkValidateAudios(generics.GenericAPIView):
+    """
+    Record many audio validations at once, e.g. the offline queue of a
+    validator. Expects `validations`, a list of {"audio_id", "status"}, and
+    returns the result of each item in the same order.
+    """
+    permission_classes = [permissions.IsAuthenticated, APILevelPermissionCheck]
+    required_permissions = ["setup.validate_audio"]
+    MAX_ITEMS = 1000
+
+    @method_decorator(ratelimit(key='user_or_ip', rate='10/m'))
+    def post(self, request, *args, **kwargs):
+        items = request.data.get("validations")
+        if not isinstance(items, list) or len(items) > self.MAX_ITEMS:
+            return Response({
+                "message": f"Send a list of at most {self.MAX_ITEMS} validations.",
+                "status": "error",
+            }, 400)
+
+        statuses = {}
+        audio_ids = []
+        for item in items:
+            audio_id = item.get("audio_id") if isinstance(item, dict) else None
+            status = item.get("status") if isinstance(item, dict) else None
+            try:
+                audio_id = int(audio_id)
+            except (TypeError, ValueError):
+                audio_id = None
+            is_valid = audio_id is not None and status in [
+                ValidationStatus.ACCEPTED.value,
+                ValidationStatus.REJECTED.value
+            ]
+            if is_valid:
+                statuses[audio_id] = status
+            audio_ids.append((audio_id, is_valid))
+
+        results = Audio.bulk_validate(request.user, statuses)
+        Audio.release_leases(list(statuses), request.user)
+        return Response({
+            "message": "Validations recorded.",
+            "status": "success",
+            "results": [{
+                "audio_id": audio_id,
+                "result": results[audio_id] if is_valid else "invalid"
+            } for audio_id, is_valid in audio_ids],
+        })
+
+
 class SubmitTranscription(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated, APILevelPermissionCheck]
     required_permissions = ["setup.transcribe_audio"]
@@ -310,12 +358,12 @@ class SubmitTranscription(generics.GenericAPIView):
     @method_decorator(ratelimit(key='user_or_ip', rate='1/s'))
     def post(self, request, *args, **kwargs):
         audio_id = request.data.get("id")
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 2
 
-        audio = Audio.objects.annotate(t_count=Count("transcriptions")).filter(
+        audio = Audio.objects.filter(
             id=audio_id,
-            t_count__lt=required_transcription_validation_count)\
+            transcription_count__lt=required_transcription_validation_count)\
             .exclude(transcriptions__user=request.user)\
             .first()
         if audio:
@@ -326,6 +374,8 @@ class SubmitTranscription(generics.GenericAPIView):
             transcription.save()
             audio.transcription_status = TranscriptionStatus.PENDING.value
             audio.save()
+            audio.release_lease(request.user)
+            validate_audio_transcriptions.delay([audio.id])
         else:
             logger.info("Audio is not available for transcription.")
             return Response({
@@ -336,3 +386,51 @@ class SubmitTranscription(generics.GenericAPIView):
             "message": "Transcription saved.",
             "status": "success",
         })
+
+
+class BulkSubmitTranscriptions(generics.GenericAPIView):
+    """
+    Save many transcriptions at once, e.g. the offline work of a transcriber.
+    Expects `transcriptions`, a list of {"audio_id", "text"}, and returns the
+    result of each item in the same order.
+    """
+    permission_classes = [permissions.IsAuthenticated, APILevelPermissionCheck]
+    required_permissions = ["setup.transcribe_audio"]
+    MAX_ITEMS = 1000
+
+    @method_decorator(ratelimit(key='user_or_ip', rate='10/m'))
+    def post(self, request, *args, **kwargs):
+        items = request.data.get("transcriptions")
+        if not isinstance(items, list) or len(items) > self.MAX_ITEMS:
+            return Response({
+                "message": f"Send a list of at most {self.MAX_ITEMS} transcriptions.",
+                "status": "error",
+            }, 400)
+
+        texts = {}
+        audio_ids = []
+        for item in items:
+            audio_id = item.get("audio_id") if isinstance(item, dict) else None
+            text = item.get("text") if isinstance(item, dict) else None
+            try:
+                audio_id = int(audio_id)
+            except (TypeError, ValueError):
+                audio_id = None
+            is_valid = audio_id is not None and isinstance(text, str) and bool(text.strip())
+            if is_valid:
+                texts[audio_id] = text
+            audio_ids.append((audio_id, is_valid))
+
+        results = Transcription.bulk_submit(request.user, texts)
+        Audio.release_leases(list(texts), request.user)
+        submitted_audio_ids = [audio_id for audio_id, result in results.items() if result != "unavailable"]
+        if submitted_audio_ids:
+            validate_audio_transcriptions.delay(submitted_audio_ids)
+        return Response({
+            "message": "Transcriptions saved.",
+            "status": "success",
+            "results": [{
+                "audio_id": audio_id,
+                "result": results[audio_id] if is_valid else "invalid"
+            } for audio_id, is_valid in audio_ids],
+        })
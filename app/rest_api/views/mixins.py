@@ -1,11 +1,15 @@
 from datetime import datetime
+import hashlib
 import math
 
-from rest_framework import generics
+from rest_framework import generics, status
 from rest_framework.response import Response
+from django.utils.http import parse_etags
 from django.utils.timezone import make_aware
 
+from local_voice.utils import assignment_sync
 from local_voice.utils.functions import apply_filters, get_errors_from_form
+from rest_api.serializers import CompactAudioSerializer
 
 QUERY_PAGE_SIZE = 10
 
@@ -115,3 +119,90 @@ class SimpleCrudMixin(generics.GenericAPIView):
             "error_message":
             f"{self.model_class.__name__} could not be deleted"
         })
+
+
+class AudioListMixin(generics.GenericAPIView):
+    """
+    Respond with a list of audios. With `compact=true` the compact
+    representation is used and the response carries a strong ETag, so an
+    unchanged list is answered with 304 Not Modified without serializing it.
+    """
+    compact_serializer_class = CompactAudioSerializer
+
+    def is_compact(self, request):
+        return "true" in request.GET.get("compact", "")
+
+    def get_list_etag(self, request, audios):
+        # The path carries the query parameters, the host the absolute URLs.
+        digest = hashlib.sha256(
+            f"{request.get_host()}{request.get_full_path()}".encode())
+        versions = audios.values_list("id", "updated_at", "image_id",
+                                      "image__updated_at")
+        for version in versions:
+            digest.update(repr(version).encode())
+        return f'"{digest.hexdigest()}"'
+
+    def get_not_modified_response(self, request, audios):
+        """Return the ETag of a compact list and a 304 response if it matches."""
+        if not self.is_compact(request):
+            return None, None
+        etag = self.get_list_etag(request, audios)
+        if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+            return etag, Response(status=status.HTTP_304_NOT_MODIFIED,
+                                  headers={"ETag": etag})
+        return etag, None
+
+    def get_list_response(self, request, audios, etag=None, **extra_data):
+        serializer_class = self.serializer_class
+        if self.is_compact(request):
+            serializer_class = self.compact_serializer_class
+            audios = audios.select_related("image")
+
+        data = serializer_class(audios, many=True, context={
+            "request": request
+        }).data
+        response = Response({"audios": data, **extra_data})
+        if etag:
+            response["ETag"] = etag
+        return response
+
+    def get_audios_response(self, request, audios):
+        etag, not_modified = self.get_not_modified_response(request, audios)
+        if not_modified:
+            return not_modified
+        return self.get_list_response(request, audios, etag)
+
+
+class AssignmentSyncMixin(AudioListMixin):
+    """
+    Respond with the audios assigned to the user. When the app sends back the
+    `sync_token` of its last response, only the audios added since then are
+    serialized, along with the ids that were removed.
+    """
+    sync_name = None
+
+    def get_sync_response(self, request, audios):
+        etag, not_modified = self.get_not_modified_response(request, audios)
+        if not_modified:
+            return not_modified
+
+        audio_ids = list(audios.values_list("id", flat=True))
+        previous_ids = assignment_sync.load_snapshot(
+            self.sync_name, request.user, request.GET.get("sync_token"))
+
+        removed = []
+        if previous_ids is not None:
+            removed = sorted(previous_ids.difference(audio_ids))
+            audios = audios.filter(id__in=[
+                audio_id for audio_id in audio_ids
+                if audio_id not in previous_ids
+            ])
+
+        return self.get_list_response(
+            request,
+            audios,
+            etag,
+            removed=removed,
+            full_sync=previous_ids is None,
+            sync_token=assignment_sync.save_snapshot(self.sync_name,
+                                                     request.user, audio_ids))
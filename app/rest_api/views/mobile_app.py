@@ -1,21 +1,28 @@
 import json
 import logging
+import os
 
-from django.db.models import Count, Q
+from django.db import transaction
+from django.db.models import Q
 from rest_framework import generics, permissions, status
 from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from django_ratelimit.decorators import ratelimit
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 
-from accounts.models import User
 from dashboard.models import (Audio, AudioTranscriptionAssignment,
-                              AudioValidationAssignment, Image, TranscriptionResolutionAssignment)
+                              AudioValidationAssignment, Image, ImageBatch,
+                              TranscriptionResolutionAssignment, UploadSession)
+from local_voice.utils import content_hash, validation_queue
 from local_voice.utils.constants import ValidationStatus
-from rest_api.serializers import (AudioSerializer, AudioUploadSerializer,
-                                  ImageSerializer,
+from local_voice.utils.sampling import random_order
+from rest_api.serializers import (AudioBatchUploadSerializer, AudioSerializer,
+                                  AudioUploadSerializer,
+                                  AudioUploadSessionSerializer, ImageSerializer,
                                   MobileAppConfigurationSerializer,
                                   ParticipantSerializer)
+from rest_api.views.mixins import AssignmentSyncMixin, AudioListMixin
 from setup.models import AppConfiguration
 
 logger = logging.getLogger("app")
@@ -55,7 +62,7 @@ class MobileAppConfigurationAPI(generics.GenericAPIView):
     serializer_class = MobileAppConfigurationSerializer
 
     def get(self, request, *args, **kwargs):
-        data = self.serializer_class(AppConfiguration.objects.first(),
+        data = self.serializer_class(AppConfiguration.get_cached(),
                                      context={
                                          "request": request
         }).data
@@ -70,24 +77,14 @@ class GetAssignedImagesAPI(generics.GenericAPIView):
         batch_number = request.user.assigned_image_batch
         images = Image.objects.filter(is_accepted=True)
         restricted_audio_count = request.user.restricted_audio_count
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         number_of_batches = configuration.number_of_batches if configuration else 8
 
         if not batch_number or batch_number <= 0 or batch_number > number_of_batches:
-            result = User.objects.filter(
-                assigned_image_batch__gt=0,
-                assigned_image_batch__lte=number_of_batches).values(
-                    'assigned_image_batch').annotate(
-                        total=Count('id')).order_by('total')
-
-            result = sorted(result, key=lambda item: item.get("total"))
-            least_used_batch = result[0].get(
-                "assigned_image_batch") if result else 1
-
+            batch_number = ImageBatch.take_least_used(number_of_batches)
             user = request.user
-            user.assigned_image_batch = least_used_batch
-            batch_number = least_used_batch
-            user.save()
+            user.assigned_image_batch = batch_number
+            user.save(update_fields=["assigned_image_batch"])
 
         if batch_number > 0:
             images = images.filter(batch_number=batch_number)
@@ -95,7 +92,7 @@ class GetAssignedImagesAPI(generics.GenericAPIView):
         if restricted_audio_count > 0 and restricted_audio_count < 125:
             images = images.order_by("-id")[:restricted_audio_count]
         else:
-            images.order_by("?")
+            images = random_order(images)
 
         data = self.serializer_class(images,
                                      many=True,
@@ -105,18 +102,51 @@ class GetAssignedImagesAPI(generics.GenericAPIView):
         return Response({"images": data})
 
 
-class GetUploadedAudios(generics.GenericAPIView):
+class GetUploadedAudios(AudioListMixin):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AudioSerializer
 
     def get(self, request, *args, **kwargs):
-        audios = Audio.objects.filter(submitted_by=request.user, deleted=False)
-        data = self.serializer_class(audios,
-                                     many=True,
-                                     context={
-                                         "request": request
-                                     }).data
-        return Response({"audios": data})
+        audios = Audio.objects.filter(submitted_by=request.user,
+                                      deleted=False).order_by("id")
+        return self.get_audios_response(request, audios)
+
+
+def get_upload_request_data(request):
+    # Convert json serialized fields into JSON object
+    request_data = {}
+    for key, value in request.data.items():
+        try:
+            request_data[key] = json.loads(value) if type(
+                value) == str else value
+        except json.decoder.JSONDecodeError as e:
+            # It is not JSON serialization.
+            request_data[key] = value
+    return request_data
+
+
+def get_invalid_upload_response(request, serializer):
+    error_messages = []
+    for field, errors in serializer.errors.items():
+        error_messages.append(f"{field}: " + str(errors))
+    logger.error(str(request.user) + " " + str(error_messages))
+    return Response({"error_messages": error_messages}, 400)
+
+
+def get_upload_response(request, saved, response):
+    if saved:
+        return Response({
+            "audio":
+            AudioSerializer(response, context={
+                "request": request
+            }).data,
+            "success":
+            True,
+            "message":
+            "Audio uploaded successfully"
+        })
+    logger.error(response)
+    return Response({"success": False, "message": response}, 400)
 
 
 class UploadAudioAPI(generics.GenericAPIView):
@@ -127,44 +157,158 @@ class UploadAudioAPI(generics.GenericAPIView):
 
     @method_decorator(ratelimit(key='user_or_ip', rate='1/s'))
     def post(self, request, *args, **kwargs):
-        # Convert json serialized fields into JSON object
-        request_data = {}
-        for key, value in request.data.items():
-            try:
-                request_data[key] = json.loads(value) if type(
-                    value) == str else value
-            except json.decoder.JSONDecodeError as e:
-                # It is not JSON serialization.
-                request_data[key] = value
-
-        serializer = self.serializer_class(request.FILES, request_data)
-        if serializer.is_valid():
-            saved, response = serializer.create(request)
-            if saved:
+        serializer = self.serializer_class(request.FILES, get_upload_request_data(request))
+        if not serializer.is_valid():
+            return get_invalid_upload_response(request, serializer)
+        saved, response = serializer.create(request)
+        return get_upload_response(request, saved, response)
+
+
+class UploadAudiosAPI(generics.GenericAPIView):
+    """
+    Upload many audio files recorded with one participant. Expects the files as
+    `audio_files` and a list of `audio_data`, one entry per file in the same
+    order, and returns the result of each file.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = AudioBatchUploadSerializer
+
+    @method_decorator(ratelimit(key='user_or_ip', rate='10/m'))
+    def post(self, request, *args, **kwargs):
+        files = request.FILES.getlist("audio_files")
+        serializer = self.serializer_class(data=get_upload_request_data(request))
+        if not serializer.is_valid():
+            return get_invalid_upload_response(request, serializer)
+        if not files or len(files) > self.serializer_class.MAX_FILES\
+                or len(files) != len(serializer.validated_data["audio_data"]):
+            return Response({
+                "success": False,
+                "message": f"Send at most {self.serializer_class.MAX_FILES} audio_files with one audio_data entry each.",
+            }, 400)
+
+        results = serializer.create(request, files)
+        return Response({
+            "success": True,
+            "message": "Audios uploaded.",
+            "results": results,
+        })
+
+
+class CreateUploadSessionAPI(generics.GenericAPIView):
+    """
+    Start a resumable audio upload. Expects the `file_name` and its `size` in
+    bytes, and returns the `session_id` to send the chunks to.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        file_name = os.path.basename(str(request.data.get("file_name") or ""))
+        try:
+            size = int(request.data.get("size"))
+        except (TypeError, ValueError):
+            size = 0
+        if not file_name or not 0 < size <= UploadSession.MAX_SIZE:
+            return Response({
+                "success": False,
+                "message": f"Send a file_name and a size of at most {UploadSession.MAX_SIZE} bytes.",
+            }, 400)
+
+        session = UploadSession.objects.create(user=request.user, file_name=file_name, size=size)
+        return Response({"success": True, "session_id": session.id, "offset": session.offset, "size": session.size})
+
+
+class UploadSessionAPI(generics.GenericAPIView):
+    """
+    GET returns the number of bytes received so far. PUT writes the raw request
+    body at the `offset` query parameter, which must be that number; on a
+    mismatch the expected offset is returned with 409 Conflict.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, session_id, *args, **kwargs):
+        session = UploadSession.objects.filter(id=session_id, user=request.user).first()
+        if not session:
+            return Response({"success": False, "message": "Upload session not found."}, 404)
+        return Response({"success": True, "session_id": session.id, "offset": session.offset, "size": session.size})
+
+    @method_decorator(ratelimit(key='user_or_ip', rate='120/m'))
+    def put(self, request, session_id, *args, **kwargs):
+        try:
+            offset = int(request.GET.get("offset"))
+        except (TypeError, ValueError):
+            offset = -1
+        data = request.body
+
+        with transaction.atomic():
+            session = UploadSession.objects.select_for_update().filter(id=session_id, user=request.user).first()
+            if not session:
+                return Response({"success": False, "message": "Upload session not found."}, 404)
+            if offset != session.offset:
                 return Response({
-                    "audio":
-                    AudioSerializer(response, context={
-                        "request": request
-                    }).data,
-                    "success":
-                    True,
-                    "message":
-                    "Audio uploaded successfully"
-                })
+                    "success": False,
+                    "message": "The offset does not match the bytes received.",
+                    "offset": session.offset,
+                }, 409)
+            if offset + len(data) > session.size:
+                return Response({"success": False, "message": "The chunk goes past the file size."}, 400)
+            session.write_chunk(offset, data)
+        return Response({"success": True, "session_id": session.id, "offset": session.offset, "size": session.size})
+
+
+class FinalizeUploadSessionAPI(generics.GenericAPIView):
+    """
+    Create the audio of a complete upload session, with the same `audio_data`
+    and `participant_data` as an upload in one request.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = AudioUploadSessionSerializer
+
+    @method_decorator(ratelimit(key='user_or_ip', rate='1/s'))
+    def post(self, request, session_id, *args, **kwargs):
+        session = UploadSession.objects.filter(id=session_id, user=request.user).first()
+        if not session:
+            return Response({"success": False, "message": "Upload session not found."}, 404)
+        if session.offset != session.size:
+            return Response({
+                "success": False,
+                "message": "The upload is not complete.",
+                "offset": session.offset,
+            }, 409)
+
+        serializer = self.serializer_class(data=get_upload_request_data(request))
+        if not serializer.is_valid():
+            return get_invalid_upload_response(request, serializer)
+
+        path = session.claim_file()
+        if path is None:
+            if os.path.exists(session.get_claimed_file_path()):
+                return Response({"success": False, "message": "The upload is being finalized."}, 409)
+            # The received bytes are lost; have the client send them again.
+            UploadSession.objects.filter(id=session.id).update(offset=0, updated_at=timezone.now())
+            return Response({"success": False, "message": "The upload must be sent again.", "offset": 0}, 409)
+
+        # The audio is created from a link to the claimed file, which stays
+        # in place until the audio exists.
+        ingest_path = path + ".ingest"
+        saved = False
+        try:
+            os.link(path, ingest_path)
+            saved, response = serializer.create_from_temp_file(request, session.file_name, ingest_path,
+                                                               content_hash.hash_path(path))
+        finally:
+            if os.path.exists(ingest_path):
+                os.remove(ingest_path)
+            if saved:
+                session.discard()
             else:
-                logger.error(response)
-                return Response({"success": False, "message": response}, 400)
-        else:
-            error_messages = []
-            for field, errors in serializer.errors.items():
-                error_messages.append(f"{field}: " + str(errors))
-            logger.error(str(request.user) + " " + str(error_messages))
-            return Response({"error_messages": error_messages}, 400)
+                session.release_file()
+        return get_upload_response(request, saved, response)
 
 
-class GetBulkAssignedToValidate(generics.GenericAPIView):
+class GetBulkAssignedToValidate(AssignmentSyncMixin):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AudioSerializer
+    sync_name = "validation"
     required_permissions = ["setup.validate_audio"]
 
     ##############################################################
@@ -178,7 +322,7 @@ class GetBulkAssignedToValidate(generics.GenericAPIView):
     def get(self, request, *args, **kwargs):
         count = min(request.data.get("count") or 1000, 1000)
         completed = "true" in request.GET.get("completed", "")
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_audio_validation_count = configuration.required_audio_validation_count if configuration else 0
 
         assignment = AudioValidationAssignment.objects.filter(
@@ -190,33 +334,40 @@ class GetBulkAssignedToValidate(generics.GenericAPIView):
             created = True
 
         if created or assignment.audios.all().count() == 0 or completed:
-            audios = Audio.objects.annotate(c=Count("assignments"), val_count=Count("validations", filter=Q(validations__archived=False))) \
-                .filter(c__lt=required_audio_validation_count) \
-                .filter(second_audio_status=ValidationStatus.PENDING.value,
-                        deleted=False,
-                        val_count__lt=required_audio_validation_count,
-                        locale=request.user.locale) \
-                .exclude(Q(validations__user=request.user) | Q(submitted_by=request.user))\
-                .order_by("image", "id")[:count]
+            previous_audio_ids = list(
+                assignment.audios.values_list("id", flat=True))
+            audios = validation_queue.take(request.user, count)
+            if audios is None:
+                # Queue unavailable, fall back to scanning the audios table.
+                audios = Audio.objects.filter(
+                    validation_assignment_count__lt=required_audio_validation_count,
+                    second_audio_status=ValidationStatus.PENDING.value,
+                    deleted=False,
+                    validation_count__lt=required_audio_validation_count,
+                    locale=request.user.locale) \
+                    .filter(Audio.free_of_lease(request.user)) \
+                    .exclude(Q(validations__user=request.user) | Q(submitted_by=request.user))\
+                    .order_by("quality_flagged", "image", "id").values_list("id", flat=True)[:count]
+            # set() only writes the difference with the current assignment.
             assignment.audios.set(audios)
             assignment.save()
-        audios = assignment.audios.annotate(val_count=Count("validations", filter=Q(validations__archived=False))).filter(
+            validation_queue.refresh(
+                set(previous_audio_ids)
+                | set(assignment.audios.values_list("id", flat=True)))
+        audios = assignment.audios.filter(
+            Audio.free_of_lease(request.user),
             second_audio_status=ValidationStatus.PENDING.value,
-            val_count__lt=required_audio_validation_count,
+            validation_count__lt=required_audio_validation_count,
             deleted=False).exclude(Q(validations__user=request.user))\
             .order_by("image", "id")
 
-        data = self.serializer_class(audios,
-                                     many=True,
-                                     context={
-                                         "request": request
-                                     }).data
-        return Response({"audios": data})
+        return self.get_sync_response(request, audios)
 
 
-class GetBulkAssignedToTranscribe(generics.GenericAPIView):
+class GetBulkAssignedToTranscribe(AssignmentSyncMixin):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AudioSerializer
+    sync_name = "transcription"
 
     ##############################################################
     # NOTE: Caching will return audios that may have been validated by the users
@@ -229,7 +380,7 @@ class GetBulkAssignedToTranscribe(generics.GenericAPIView):
     def get(self, request, *args, **kwargs):
         count = min(request.data.get("count") or 480, 1000)
         completed = "true" in request.GET.get("completed", "")
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 0
 
         assignment = AudioTranscriptionAssignment.objects.filter(
@@ -252,39 +403,34 @@ class GetBulkAssignedToTranscribe(generics.GenericAPIView):
         }
 
         if created or assignment.audios.all().count() == 0 or completed:
-            audios = (Audio.objects.annotate(
-                t_assign=Count("transcriptions_assignments"),
-                t_count=Count("transcriptions")).filter(
+            audios = (Audio.objects.filter(
                     Q(**transcription_count_filter)).filter(
                 Q(second_audio_status=ValidationStatus.ACCEPTED.value)
             ).filter(
                         transcription_status=ValidationStatus.PENDING.value,
                         locale=request.user.locale,
                         deleted=False,
-                        t_assign__lt=required_transcription_validation_count,
-                        t_count__lt=required_transcription_validation_count).
-                exclude(Q(transcriptions__user=request.user)))[:count]
+                        transcription_assignment_count__lt=required_transcription_validation_count,
+                        transcription_count__lt=required_transcription_validation_count).
+                filter(Audio.free_of_lease(request.user)).
+                exclude(Q(transcriptions__user=request.user))).values_list("id", flat=True)[:count]
             assignment.audios.set(audios)
             assignment.save()
-        audios = assignment.audios.annotate(
-            t_count=Count("transcriptions")).filter(
+        audios = assignment.audios.filter(
+                Audio.free_of_lease(request.user),
                 **transcription_count_filter,
                 transcription_status=ValidationStatus.PENDING.value,
-                t_count__lt=required_transcription_validation_count,
+                transcription_count__lt=required_transcription_validation_count,
                 deleted=False).exclude(
-                    Q(transcriptions__user=request.user)).order_by("image", locale_count, "t_count")
+                    Q(transcriptions__user=request.user)).order_by("image", locale_count, "transcription_count")
 
-        data = self.serializer_class(audios,
-                                     many=True,
-                                     context={
-                                         "request": request
-                                     }).data
-        return Response({"audios": data})
+        return self.get_sync_response(request, audios)
 
 
-class GetBulkAssignedTranscriptionsToResolve(generics.GenericAPIView):
+class GetBulkAssignedTranscriptionsToResolve(AssignmentSyncMixin):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = AudioSerializer
+    sync_name = "resolution"
 
     ##############################################################
     # NOTE: Caching will return audios that may have been validated by the users
@@ -308,26 +454,20 @@ class GetBulkAssignedTranscriptionsToResolve(generics.GenericAPIView):
             created = True
 
         if created or assignment.audios.filter(locale=request.user.locale).count() == 0 or completed:
-            audios = (Audio.objects.annotate(
-                t_assign=Count("transcription_resolutions_assignments"),
-                t_count=Count("transcriptions")).filter(
+            audios = (Audio.objects.filter(
                 transcription_status=ValidationStatus.PENDING.value,
                 locale=request.user.locale,
                 deleted=False,
-                t_assign__lt=required_transcription_validation_count,
-                t_count__gte=1).
-                exclude(Q(transcriptions__user=request.user)))[:count]
+                resolution_assignment_count__lt=required_transcription_validation_count,
+                transcription_count__gte=1).
+                filter(Audio.free_of_lease(request.user)).
+                exclude(Q(transcriptions__user=request.user))).values_list("id", flat=True)[:count]
             assignment.audios.set(audios)
             assignment.save()
-        audios = assignment.audios.annotate(
-            t_count=Count("transcriptions")).filter(
+        audios = assignment.audios.filter(
+                Audio.free_of_lease(request.user),
                 transcription_status=ValidationStatus.PENDING.value,
                 locale=request.user.locale,
                 deleted=False).exclude(
-                    Q(transcriptions__user=request.user)).order_by("image", "t_count")
-        data = self.serializer_class(audios,
-                                     many=True,
-                                     context={
-                                         "request": request
-                                     }).data
-        return Response({"audios": data})
+                    Q(transcriptions__user=request.user)).order_by("image", "transcription_count")
+        return self.get_sync_response(request, audios)
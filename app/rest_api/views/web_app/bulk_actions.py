@@ -4,6 +4,7 @@ from rest_framework import generics, permissions
 from rest_framework.response import Response
 
 from dashboard.models import Audio, Image, Participant, Transcription
+from local_voice.utils import validation_queue
 from local_voice.utils.constants import ValidationStatus
 from rest_api.permissions import APILevelPermissionCheck
 
@@ -83,6 +84,7 @@ class AudiosBulkAction(generics.GenericAPIView):
                 if not audio.conflict_resolved_by:
                     Audio.objects.filter(id=audio.id).update(
                         conflict_resolved_by=request.user)
+            validation_queue.refresh(ids)
             return Response({"message": f"Updated {audios.count()} audios."})
 
         elif action == "delete":
@@ -3,14 +3,14 @@ import math
 from datetime import datetime
 
 from django.contrib.auth.models import Group, Permission
-from django.db.models import Count, Q
+from django.db.models import Q
+from django.db.models.functions import Random
 from django.utils.decorators import method_decorator
 from django.utils.timezone import make_aware
 from django.views.decorators.cache import cache_page
 from django.views.decorators.vary import vary_on_headers
 from rest_framework import generics, permissions
 from rest_framework.response import Response
-from django.db import transaction
 from accounts.forms import GroupForm, UserForm
 from accounts.models import User
 from rest_api.tasks import (get_audios_pending,
@@ -25,9 +25,10 @@ from rest_api.serializers import UserStatisticSerializer
 from local_voice.utils.constants import TranscriptionStatus
 from app_statistics.models import Statistics
 from dashboard.forms import CategoryForm
-from dashboard.models import (Audio, Category, Image, Notification,
-                              Participant, Transcription)
-from local_voice.utils.constants import ValidationStatus
+from dashboard.models import (Audio, Category, Image, ImageBatch,
+                              Notification, Participant, Transcription)
+from local_voice.utils import validation_queue
+from local_voice.utils.constants import LeaseDuration, ValidationStatus
 from local_voice.utils.functions import (apply_filters, get_errors_from_form,
                                          relevant_permission_objects)
 from rest_api.permissions import APILevelPermissionCheck
@@ -52,7 +53,7 @@ class GetImagesToValidate(generics.GenericAPIView):
     serializer_class = ImageSerializer
 
     def get(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         offset = request.GET.get("offset", -1)
         required_image_validation_count = configuration.required_image_validation_count if configuration else 0
         max_allowed_validation = configuration.max_image_for_validation_per_user if configuration else 0
@@ -118,24 +119,20 @@ class GetAudiosToTranscribe(generics.GenericAPIView):
     serializer_class = AudioTranscriptionSerializer
 
     def get(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 2
         offset = request.GET.get("offset", -1)
 
-        audio = Audio.objects.annotate(t_count=Count("transcriptions"), t_assign=Count("transcriptions_assignments")).filter(
+        audios = Audio.objects.filter(
             deleted=False,
             transcription_status=ValidationStatus.PENDING.value,
-            t_assign__lt=required_transcription_validation_count,
-            t_count__lt=required_transcription_validation_count,
+            transcription_assignment_count__lt=required_transcription_validation_count,
+            transcription_count__lt=required_transcription_validation_count,
             locale=request.user.locale)\
             .filter(Q(second_audio_status=ValidationStatus.ACCEPTED.value))\
             .exclude(Q(transcriptions__user=request.user) | Q(id=offset))\
-            .order_by("image", "-t_count", "?")\
-            .first()
-
-        if audio:
-            audio.transcription_status = ValidationStatus.IN_REVIEW.value
-            audio.save()
+            .order_by("image", "-transcription_count", "random_key")
+        audio = Audio.claim(audios, request.user, LeaseDuration.TRANSCRIPTION.value)
 
         data = self.serializer_class(audio, context={
             "request": request
@@ -151,7 +148,7 @@ class GetTranscriptionToValidate(generics.GenericAPIView):
     serializer_class = TranscriptionSerializer
 
     def get(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 2
         offset = request.GET.get("offset", -1)
 
@@ -217,7 +214,7 @@ class GroupsAPI(SimpleCrudMixin):
 
     def get(self, request):
         limited = "true" in request.GET.get("limited", "")
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         groups = Group.objects.all()
         if limited:
             groups = configuration.limited_groups.all(
@@ -336,7 +333,7 @@ class AppConfigurationAPI(generics.GenericAPIView):
     serializer_class = AppConfigurationSerializer
 
     def get(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         data = self.serializer_class(configuration,
                                      context={
                                          "request": request
@@ -468,6 +465,7 @@ class CollectedAudiosAPI(SimpleCrudMixin):
             audio_obj.conflict_resolved_by = request.user
 
         audio_obj.save()
+        validation_queue.refresh([audio_obj.id])
 
         return Response({
             "message":
@@ -489,8 +487,7 @@ class CollectedTranscriptionsAPI(SimpleCrudMixin):
     response_data_label_plural = "audios"
 
     def modify_response_data(self, objects):
-        return objects.annotate(t_count=Count("transcriptions")).filter(
-            t_count__gt=0)
+        return objects.filter(transcription_count__gt=0)
 
     def get(self, request, *args, **kwargs):
         filters = request.GET.getlist("filters")
@@ -611,7 +608,7 @@ class ReShuffleImageIntoBatches(generics.GenericAPIView):
 
     def post(self, request, *args, **kwargs):
         filter_accepted = request.GET.get("is_accepted", False)
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         number_of_batches = configuration.number_of_batches if configuration else 0
         count = 0
 
@@ -620,9 +617,11 @@ class ReShuffleImageIntoBatches(generics.GenericAPIView):
         if filter_accepted:
             images = images.filter(is_accepted=True)
 
-        for count, image in enumerate(images.order_by('?')):
+        images.update(random_key=Random())
+        images = list(images.order_by("random_key").only("id"))
+        for count, image in enumerate(images):
             image.batch_number = count % number_of_batches + 1
-            image.save()
+        Image.objects.bulk_update(images, ["batch_number"], batch_size=1000)
         logger.info(
             f"Reshuffle {count + 1} images into {number_of_batches} batches.")
         return Response({
@@ -636,7 +635,7 @@ class AssignImageBatchToUsers(generics.GenericAPIView):
     required_permissions = ["setup.manage_setup"]
 
     def post(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         enumerators_group = configuration.enumerators_group if configuration else None
         validators_group = configuration.validators_group if configuration else None
         number_of_batches = configuration.number_of_batches if configuration else None
@@ -648,23 +647,30 @@ class AssignImageBatchToUsers(generics.GenericAPIView):
         User.objects.filter(assigned_image_batch__gt=-1).update(
             assigned_audio_batch=-1, assigned_image_batch=-1)
 
-        count = -1
-        for count, user in enumerate(enumerators_group.user_set.all().order_by(
-                "id")):  # type: ignore
+        enumerators = list(
+            enumerators_group.user_set.all().order_by("id").only("id"))  # type: ignore
+        batch_counts = {number: 0 for number in range(1, number_of_batches + 1)}  # type: ignore
+        for count, user in enumerate(enumerators):
             user.assigned_image_batch = count % number_of_batches + 1  # type: ignore
-            user.save()
+            batch_counts[user.assigned_image_batch] += 1
+        User.objects.bulk_update(enumerators, ["assigned_image_batch"],
+                                 batch_size=1000)
+        ImageBatch.set_counts(batch_counts)
 
         # Assign audio batches
-        for user in validators_group.user_set.all().order_by(
-                "id"):  # type: ignore
-            if user.assigned_image_batch >= 0:  # Else this user wasn't assigned a batch of images hence can validate any batch
-                user.assigned_audio_batch = (user.assigned_image_batch +
-                                             1) % number_of_batches
-                user.save()
+        # Users without a batch of images can validate any batch.
+        validators = list(
+            validators_group.user_set.filter(assigned_image_batch__gte=0).order_by(
+                "id").only("id", "assigned_image_batch"))  # type: ignore
+        for user in validators:
+            user.assigned_audio_batch = (user.assigned_image_batch +
+                                         1) % number_of_batches
+        User.objects.bulk_update(validators, ["assigned_audio_batch"],
+                                 batch_size=1000)
 
         return Response({
             "message":
-            f"Shuffled {count + 1} users among {number_of_batches} batches."
+            f"Shuffled {len(enumerators)} users among {number_of_batches} batches."
         })
 
 
@@ -672,7 +678,7 @@ class WebAppConfigurations(generics.GenericAPIView):
     permission_classes = [permissions.AllowAny]
 
     def get(self, request, *args, **kwargs):
-        config = AppConfiguration.objects.first()
+        config = AppConfiguration.get_cached()
         if config:
             return Response({
                 "message": "Web app configurations",
@@ -884,23 +890,19 @@ class GetAudioTranscriptionToResolve(generics.GenericAPIView):
     serializer_class = AudioTranscriptionSerializer
 
     def get(self, request, *args, **kwargs):
-        configuration = AppConfiguration.objects.first()
+        configuration = AppConfiguration.get_cached()
         required_transcription_validation_count = configuration.required_transcription_validation_count if configuration else 2
         offset = request.GET.get("offset", -1)
 
-        with transaction.atomic():
-            audio = Audio.objects.annotate(t_count=Count("transcriptions")).filter(
-                deleted=False,
-                second_audio_status=ValidationStatus.ACCEPTED.value,
-                transcription_status=TranscriptionStatus.CONFLICT.value,
-                t_count__gte=required_transcription_validation_count,
-                locale=request.user.locale)\
-                .exclude(Q(transcriptions__user=request.user) | Q(id=offset))\
-                .order_by("-t_count", "?")\
-                .first()
-            if audio:
-                audio.transcription_status = ValidationStatus.IN_REVIEW.value
-                audio.save()
+        audios = Audio.objects.filter(
+            deleted=False,
+            second_audio_status=ValidationStatus.ACCEPTED.value,
+            transcription_status=TranscriptionStatus.CONFLICT.value,
+            transcription_count__gte=required_transcription_validation_count,
+            locale=request.user.locale)\
+            .exclude(Q(transcriptions__user=request.user) | Q(id=offset))\
+            .order_by("-transcription_count", "random_key")
+        audio = Audio.claim(audios, request.user, LeaseDuration.RESOLUTION.value)
         data = self.serializer_class(audio, context={
             "request": request
         }).data if audio else None
@@ -928,6 +930,7 @@ class GetAudioTranscriptionToResolve(generics.GenericAPIView):
 
         audio.transcription_status = transcription_status
         audio.save()
+        audio.release_lease(request.user)
 
         return Response({
             "message":
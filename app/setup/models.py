@@ -1,11 +1,25 @@
+import logging
+
+import redis
 from django.conf import settings
 from django.contrib.auth.models import Group
 from django.db import models
+from redis.exceptions import RedisError
+
+from local_voice.utils.file_tracking import FileTrackingMixin
+
+logger = logging.getLogger("app")
+
+redis_client = redis.Redis(host=settings.REDIS_HOST, port=settings.REDIS_PORT)
+
+# Bumped on every change so each process knows when to reload its copy.
+CONFIGURATION_VERSION_KEY = "app_configuration_version"
+_cached_configuration = {}
 
 #yapf: disable
 
 # General system config table - only one row.
-class AppConfiguration(models.Model):
+class AppConfiguration(FileTrackingMixin, models.Model):
     demo_video_ewe = models.FileField(upload_to="demovideos",null=True, blank=True)
     demo_video_akan = models.FileField(upload_to="demovideos",null=True, blank=True)
     demo_video_dagaare = models.FileField(upload_to="demovideos",null=True, blank=True)
@@ -48,12 +62,53 @@ class AppConfiguration(models.Model):
     current_apk_versions = models.CharField(max_length=11,default="")
     limited_groups = models.ManyToManyField(Group, related_name="configurations")
 
+    tracked_file_fields = [
+        "android_apk",
+        "demo_video_ewe",
+        "demo_video_akan",
+        "demo_video_dagaare",
+        "demo_video_ikposo",
+        "demo_video_dagbani",
+        "participant_privacy_statement_audio_ewe",
+        "participant_privacy_statement_audio_akan",
+        "participant_privacy_statement_audio_dagaare",
+        "participant_privacy_statement_audio_ikposo",
+        "participant_privacy_statement_audio_dagbani",
+    ]
+
     def save(self, *args, **kwargs) -> None:
         if self.android_apk:
             version = self.android_apk.file.name.split("v")[-1].split("-")[0]
             self.current_apk_versions  = version
             return super().save(*args, **kwargs)
 
+    @staticmethod
+    def get_cached():
+        """
+        Return the configuration held by this process, reloading it once the
+        version in Redis changed. Reads the database when Redis is unavailable.
+        The returned object is shared, so it must not be modified.
+        """
+        try:
+            version = redis_client.get(CONFIGURATION_VERSION_KEY)
+        except RedisError as e:
+            logger.error(f"Configuration version lookup failed: {e}")
+            return AppConfiguration.objects.first()
+
+        if "configuration" not in _cached_configuration or _cached_configuration.get("version") != version:
+            # The version is read first, so a concurrent change triggers another reload.
+            _cached_configuration["configuration"] = AppConfiguration.objects.first()
+            _cached_configuration["version"] = version
+        return _cached_configuration["configuration"]
+
+    @staticmethod
+    def invalidate_cache():
+        _cached_configuration.clear()
+        try:
+            redis_client.incr(CONFIGURATION_VERSION_KEY)
+        except RedisError as e:
+            logger.error(f"Configuration version update failed: {e}")
+
 
 
 # Just for permissions